@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+
+from utils.logger import Logger
+
+logger = Logger.get_logger('analysis_cache')
+
+
+class AnalysisCache:
+    """按内容寻址的分析结果与报告文件缓存，在所有订阅者和多次运行之间共享
+
+    缓存键为 (带版本号的entry_id, 规范化后的查询, 模型, 提示词版本[, 模板, 报告类型]) 的sha256，
+    条目以文件形式存放在 cache_dir/<键前两位>/<键>.<后缀>，超过TTL视为失效；
+    总大小超过预算时按最近访问时间淘汰。
+    """
+    def __init__(self, cache_dir="./analysis_cache", ttl_seconds=7 * 24 * 3600,
+                 max_bytes=2 * 1024 ** 3, evict_interval=60):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self._last_evict = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def normalize_query(query):
+        """规范化查询：全半角统一、忽略大小写、标点和多余空白"""
+        query = unicodedata.normalize('NFKC', query or '').lower()
+        query = re.sub(r'[^\w]+', ' ', query)
+        return ' '.join(query.split())
+
+    @classmethod
+    def make_key(cls, entry_id, query, model, prompt_version, template=None, report_type=None, context=None):
+        payload = json.dumps([
+            entry_id, cls.normalize_query(query), model, prompt_version, template, report_type, context
+        ], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{suffix}")
+
+    def _fresh_path(self, key, suffix):
+        """返回未过期条目的路径并刷新其访问时间，未命中返回None"""
+        path = self._path(key, suffix)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if time.time() - mtime > self.ttl_seconds:
+            self._remove(path)
+            return None
+        # 只更新atime用于LRU淘汰，mtime保留写入时间用于TTL判断
+        os.utime(path, (time.time(), mtime))
+        return path
+
+    def get_analysis(self, key):
+        path = self._fresh_path(key, 'json')
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                analysis = json.load(f)
+            logger.info(f"分析结果缓存命中: {key[:12]}")
+            return analysis
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"读取分析缓存失败 {key[:12]}: {e}")
+            self._remove(path)
+            return None
+
+    def set_analysis(self, key, analysis):
+        self._write(key, 'json', json.dumps(analysis, ensure_ascii=False).encode('utf-8'))
+
+    def get_artifact(self, key, suffix):
+        """返回已缓存的报告文件路径，未命中返回None"""
+        return self._fresh_path(key, suffix)
+
+    def put_artifact(self, key, suffix, source_path):
+        """将渲染好的报告文件存入缓存"""
+        try:
+            with open(source_path, 'rb') as f:
+                self._write(key, suffix, f.read())
+        except OSError as e:
+            logger.error(f"缓存报告文件失败 {source_path}: {e}")
+
+    def _write(self, key, suffix, data):
+        path = self._path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"写入缓存失败 {key[:12]}: {e}")
+            self._remove(tmp_path)
+            return
+        self._maybe_evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _maybe_evict(self):
+        now = time.time()
+        if now - self._last_evict < self.evict_interval:
+            return
+        with self._lock:
+            if now - self._last_evict < self.evict_interval:
+                return
+            self._last_evict = now
+        self.evict()
+
+    def evict(self):
+        """删除过期条目，并按最近访问时间淘汰直到总大小不超过预算，返回删除的文件数"""
+        now = time.time()
+        entries, removed, total = [], 0, 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp'):
+                    continue
+                if now - stat.st_mtime > self.ttl_seconds:
+                    self._remove(path)
+                    removed += 1
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"缓存淘汰 {removed} 个文件，当前大小 {total / 1024 ** 2:.1f} MB")
+        return removed
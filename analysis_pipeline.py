@@ -0,0 +1,106 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logger import Logger
+
+logger = Logger.get_logger('analysis_pipeline')
+
+
+class ArticleResult:
+    """单篇文章在流水线中的处理结果"""
+    def __init__(self, index, article):
+        self.index = index
+        self.article = article
+        self.analysis = None
+        self.report_path = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.analysis is not None
+
+
+class ArticlePipeline:
+    """按阶段并发处理文章：翻译+PDF解析(I/O) → 深度分析(LLM) → 报告渲染
+
+    每个阶段有独立的并发上限：I/O与LLM阶段用信号量限流，渲染阶段使用
+    ReportRenderer的有界渲染池。一篇文章失败只记录错误，不影响其他文章；
+    结果始终按输入顺序返回，保证合并报告的顺序稳定。
+    """
+    def __init__(self, translate_model, post_processor, io_workers=4, llm_workers=2):
+        self.translate_model = translate_model
+        self.post_processor = post_processor
+        self.io_workers = io_workers
+        self.llm_workers = llm_workers
+        self._io_slots = threading.Semaphore(io_workers)
+        self._llm_slots = threading.Semaphore(llm_workers)
+
+    def _prepare(self, result, query):
+        """I/O阶段：翻译标题摘要，分析缓存未命中时解析PDF全文"""
+        article = result.article
+        with self._io_slots:
+            article.translate_content(self.translate_model)
+            if not self.post_processor.has_cached_analysis(article, query):
+                article._parse_pdf_sections()
+
+    def _analyze(self, result, query):
+        with self._llm_slots:
+            result.analysis = self.post_processor.analyze_article(result.article, query)
+
+    def _render(self, result, query, template_name, output_dir, report_type):
+        # 渲染并发由ReportRenderer的渲染池限制
+        result.report_path = self.post_processor.export_article_report(
+            result.article, result.analysis, query,
+            template_name=template_name, output_dir=output_dir, report_type=report_type
+        )
+
+    def _process(self, result, query, template_name, output_dir, report_type):
+        try:
+            logger.info(f"开始处理第 {result.index + 1} 篇文章: {result.article.title}")
+            self._prepare(result, query)
+            self._analyze(result, query)
+            if report_type is not None:
+                self._render(result, query, template_name, output_dir, report_type)
+        except Exception as e:
+            result.error = e
+            logger.error(f"处理文章时出错 {result.article.entry_id}: {e}")
+        return result
+
+    def run(self, articles, query, template_name='v1.html', output_dir=None, report_type='pdf'):
+        """并发处理所有文章
+
+        Args:
+            articles: Article对象列表
+            query: 用户查询
+            template_name: 报告模板
+            output_dir: 报告输出目录
+            report_type: 'pdf'、'png'，为None时只生成分析不单独导出
+
+        Returns:
+            list[ArticleResult]: 与articles顺序一致的处理结果
+        """
+        results = [ArticleResult(index, article) for index, article in enumerate(articles)]
+        if not results:
+            return results
+
+        # 每篇文章一个驱动线程，实际并发由各阶段的限流决定
+        max_workers = min(len(results), self.io_workers + self.llm_workers + self.post_processor.config.render_workers())
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='article-pipeline') as executor:
+            futures = [
+                executor.submit(self._process, result, query, template_name, output_dir, report_type)
+                for result in results
+            ]
+            for future in futures:
+                future.result()
+
+        n_failed = sum(1 for result in results if not result.ok)
+        logger.info(f"流水线处理完成: 成功 {len(results) - n_failed} 篇，失败 {n_failed} 篇")
+        return results
+
+    def run_briefs(self, articles, query):
+        """为超出深度分析预算的文章并发生成仅基于摘要的简要概括"""
+        if not articles:
+            return articles
+        with ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix='article-brief') as executor:
+            list(executor.map(lambda article: article.generate_brief(query, self.translate_model), articles))
+        return articles
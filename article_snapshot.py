@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import defaultdict
+
+from mysql.connector import Error
+
+from models import ArticleRecord, BEIJING_TZ
+from utils.logger import Logger
+
+logger = Logger.get_logger('article_snapshot')
+
+
+class ArticleSnapshot:
+    """当前发布时间窗口内文章的内存快照
+
+    整个窗口只用一条按published范围的查询（走idx_published）读入ArticleRecord，
+    在内存中按entry_id与类别建立索引，各类别、各订阅的查询都从快照读取，
+    不再对每个类别执行无法使用索引的JSON_CONTAINS查询。
+    刷新是增量的：只查询窗口内的entry_id，与已有记录比对后读取新入库的行、
+    移除已不在窗口内的行；距上次刷新不足refresh_seconds时直接使用现有快照。
+    快照由同一进程内的订阅线程共享，读取时拿到的是刷新时整体替换的不可变索引。
+    提供bm25时，新入库与移出窗口的文章同步加入/移出该BM25Index。
+    """
+    ID_CHUNK = 500
+
+    def __init__(self, db, refresh_seconds=300, bm25=None):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.bm25 = bm25
+        self.window = None
+        self._records = {}  # entry_id -> ArticleRecord
+        self._by_category = {}  # category -> [ArticleRecord]，按发布时间倒序；None为所有类别
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, entry_id):
+        return self._records.get(entry_id)
+
+    def ensure(self, window, force=False):
+        """保证快照覆盖window并且足够新
+
+        窗口终点变化（跨天）时快照改为只覆盖新窗口，旧窗口的文章随之移除；
+        终点相同而起点更早（如补跑的订阅）时向前扩展。
+        """
+        with self._lock:
+            if self.window is None or self.window[1] != window[1]:
+                target = window
+            else:
+                target = (min(self.window[0], window[0]), window[1])
+            stale = (
+                self._refreshed_at is None
+                or time.monotonic() - self._refreshed_at >= self.refresh_seconds
+            )
+            if force or target != self.window or stale:
+                self._refresh(target)
+
+    def refresh(self):
+        """立即增量刷新当前窗口（如新一批文章入库之后）"""
+        if self.window is not None:
+            self.ensure(self.window, force=True)
+
+    def _refresh(self, window):
+        start, end = window
+        try:
+            with self.db.cursor() as cursor:
+                cursor.execute(
+                    "SELECT entry_id FROM arxiv_daily WHERE published >= %s AND published < %s",
+                    (start, end)
+                )
+                current = {row[0] for row in cursor.fetchall()}
+        except Error as e:
+            logger.error(f"刷新文章快照失败，继续使用现有快照: {e}")
+            return
+
+        records = {entry_id: record for entry_id, record in self._records.items() if entry_id in current}
+        added = [entry_id for entry_id in current if entry_id not in records]
+        try:
+            for record in self._load(added):
+                records[record.entry_id] = record
+        except Error as e:
+            logger.error(f"读取新增文章失败，继续使用现有快照: {e}")
+            return
+
+        removed = [entry_id for entry_id in self._records if entry_id not in current]
+        if self.bm25 is not None:
+            for entry_id in removed:
+                self.bm25.remove(entry_id)
+        if added or removed or window != self.window:
+            self._records = records
+            self._by_category = self._index(records.values())
+        self.window = window
+        self._refreshed_at = time.monotonic()
+        logger.info(
+            f"文章快照已刷新: 共 {len(records)} 篇，新增 {len(added)} 篇，移除 {len(removed)} 篇"
+        )
+
+    def _load(self, entry_ids):
+        index_cn = self.bm25 is not None and self.bm25.include_cn
+        # 中文标题与摘要只用于建立索引，不保存在记录中
+        columns = ", ".join(ArticleRecord.COLUMNS + (('CN_title', 'CN_summary') if index_cn else ()))
+        for i in range(0, len(entry_ids), self.ID_CHUNK):
+            chunk = entry_ids[i:i + self.ID_CHUNK]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            with self.db.cursor(dictionary=True) as cursor:
+                cursor.execute(
+                    f"SELECT {columns} FROM arxiv_daily WHERE entry_id IN ({placeholders})", tuple(chunk)
+                )
+                rows = cursor.fetchall()
+            for row in rows:
+                if self.bm25 is not None:
+                    self.bm25.add(row['entry_id'], row['title'], row['summary'],
+                                  row.get('CN_title'), row.get('CN_summary'))
+                yield ArticleRecord.from_row(row, tz=BEIJING_TZ)
+
+    @staticmethod
+    def _index(records):
+        ordered = sorted(records, key=lambda record: record.published, reverse=True)
+        by_category = defaultdict(list)
+        by_category[None] = ordered
+        for record in ordered:
+            for category in record.categories:
+                by_category[category].append(record)
+        return dict(by_category)
+
+    def records(self, category, window, limit=None):
+        """窗口内属于category（None为所有类别）的文章记录，按发布时间倒序，语义同articles_query
+
+        Returns:
+            list[ArticleRecord]
+        """
+        self.ensure(window)
+        start, end = window
+        result = []
+        for record in self._by_category.get(category, []):
+            if record.published >= end:
+                continue
+            if record.published < start:
+                break
+            result.append(record)
+            if limit and len(result) >= limit:
+                break
+        return result
@@ -1,37 +1,38 @@
-from models import LLMModel, Article, Config
+from models import LLMModel, Article, Config, ANALYSIS_PROMPT_VERSION
+from analysis_cache import AnalysisCache
 from utils.logger import Logger
 
 import re
 from typing import Dict, Any
-from jinja2 import Environment, FileSystemLoader
+from report_renderer import ReportRenderer
 import os
 from datetime import datetime
-import imgkit
-
-import pdfkit
-from PyPDF2 import PdfMerger
-import oss2
 import tempfile
 import shutil
 
+# PyPDF2 在合并时才导入，缩短启动时间
 logger = Logger.get_logger('articles_processor')
 
 class ArticlePostProcessor:
     """文章后处理器，负责生成最终报告和结构化数据"""
     def __init__(self, llm: LLMModel):
         self.llm = llm
-        # 设置Jinja2环境
-        template_dir = os.path.join(os.path.dirname(__file__), 'template')
-        self.jinja_env = Environment(loader=FileSystemLoader(template_dir))
+        # 共享的渲染服务：预编译模板的Jinja环境 + 有界的wkhtmltopdf渲染池
+        self.renderer = ReportRenderer()
+        self.jinja_env = self.renderer.env
         self.config = Config()
+        # 分析结果与报告文件缓存，相同论文+相近查询在订阅者之间复用
+        self.cache = AnalysisCache(**self.config.analysis_cache_config())
 
     
     def generate_html_report(self, article: Article, analysis: dict, template_name: str = 'default.html') -> str:
         """生成HTML格式的分析报告"""
         template = self.jinja_env.get_template(template_name)
-        
-        # 准备模板数据
-        template_data = {
+        return template.render(**self._build_template_data(article, analysis))
+
+    def _build_template_data(self, article: Article, analysis: dict) -> dict:
+        """准备单篇文章报告的模板数据"""
+        return {
             'title': article.title,
             'title_cn': article.CN_title,
             'article_url': article.entry_id,
@@ -56,8 +57,60 @@ class ArticlePostProcessor:
             'author_institutions': article.author_and_affiliation.get('author_institutions', []),  # 添加作者机构信息
             'update_time': datetime.now().strftime('%Y年%m月%d日 %H:%M')
         }
-        
-        return template.render(**template_data)
+
+    def generate_digest_html(self, reports, template_name: str = 'v1.html', title: str = '今日论文', briefs=None) -> str:
+        """将多篇文章的报告合并为一个HTML文档，每篇文章独占一页
+
+        Args:
+            reports: (Article, analysis) 元组列表，顺序即报告中的顺序
+            template_name: 单篇文章使用的模板
+            title: 合并文档的标题
+            briefs: 超出分析预算、只有简要概括的文章列表，附在文档末尾
+        """
+        template = self.jinja_env.get_template(template_name)
+        styles, pages = [], []
+        for article, analysis in reports:
+            try:
+                html = template.render(**self._build_template_data(article, analysis))
+            except Exception as e:
+                logger.error(f"渲染文章报告时出错 {article.entry_id}: {e}")
+                continue
+            # 同一模板渲染出的样式相同，只保留第一篇的样式
+            if not styles:
+                styles = re.findall(r'<style[^>]*>(.*?)</style>', html, re.S)
+            body = re.search(r'<body[^>]*>(.*)</body>', html, re.S)
+            pages.append(body.group(1) if body else html)
+
+        brief_items = [
+            {
+                'title': article.title,
+                'title_cn': article.CN_title,
+                'article_url': article.entry_id,
+                'brief': article.brief,
+            }
+            for article in (briefs or [])
+        ]
+        return self.jinja_env.get_template('digest.html').render(
+            title=title, styles=styles, pages=pages, briefs=brief_items
+        )
+
+    def render_digest(self, reports, output_path: str, template_name: str = 'v1.html', briefs=None) -> bool:
+        """只调用一次wkhtmltopdf，把所有文章的报告渲染到同一个PDF中
+
+        Args:
+            reports: (Article, analysis) 元组列表
+            output_path: 输出PDF路径
+            briefs: 只有简要概括的文章列表
+
+        Returns:
+            bool: 是否成功生成PDF
+        """
+        if not reports and not briefs:
+            return False
+        html_digest = self.generate_digest_html(reports, template_name=template_name, briefs=briefs)
+        # 合并文档的渲染时间随文章数增长，按篇数放宽超时
+        timeout = self.renderer.timeout * max(len(reports), 1)
+        return self.renderer.submit_pdf(html_digest, output_path, timeout=timeout).result()
     
     def _parse_rating_text(self, rating_text: str) -> dict:
         """解析评分文本为结构化数据"""
@@ -87,46 +140,17 @@ class ArticlePostProcessor:
 
     def export_to_image(self, html_content, output_path):
         """将HTML导出为移动端样式的图片"""
-        options = {
-        'format': 'png',
-        # 核心参数：缩放倍数与分辨率配合
-        'zoom': 2,          # 关键！2倍缩放相当于2倍物理像素
-        'width': 1248,       # 逻辑像素（与移动端viewport同尺寸）
-        
-        # 可选质量增强参数
-        'quality': 100,     # 适用于jpeg格式
-        
-        # 渲染引擎优化
-        'disable-smart-width': '',
-        'enable-local-file-access': None  # 允许加载本地资源
-        }
-        
-        imgkit.from_string(html_content, output_path, options=options)
+        return self.renderer.submit_image(html_content, output_path).result()
 
     def export_to_pdf(self, html_content, output_path):
         """将HTML导出为PDF格式"""
-        options = {
-            'page-size': 'A4',
-            'margin-top': '0.1in',
-            'margin-right': '0.1in',
-            'margin-bottom': '0.2in',
-            'margin-left': '0.1in',
-            'zoom': 1.2,
-            'encoding': 'UTF-8',
-            'quiet': '',
-            'enable-local-file-access': None,
-            'dpi': 500,
-            'image-quality': 100,
-            'header-font-size': '8',
-            'footer-font-size': '8',
-            'enable-smart-shrinking': '',
-        }
-        
-        try:
-            pdfkit.from_string(html_content, output_path, options=options)
-            logger.info(f"成功导出PDF到: {output_path}")
-        except Exception as e:
-            logger.error(f"导出PDF时出错: {e}")
+        return self.renderer.submit_pdf(html_content, output_path).result()
+
+    def submit_export(self, html_content, output_path, report_type='pdf'):
+        """提交到共享渲染池异步导出，返回Future（结果为bool）"""
+        if report_type == 'pdf':
+            return self.renderer.submit_pdf(html_content, output_path)
+        return self.renderer.submit_image(html_content, output_path)
 
     def upload_to_oss(self, file_path: str, oss_key: str) -> str:
         """上传文件到OSS并返回访问URL
@@ -148,6 +172,68 @@ class ArticlePostProcessor:
             logger.error(f"上传到OSS时出错: {e}")
             return None
 
+    def _context_settings(self):
+        """影响分析输入的上下文配置，修改后旧的分析结果不再命中"""
+        return [self.config.context_token_budget(), self.config.context_chunk_tokens()]
+
+    def _analysis_key(self, article: Article, query: str) -> str:
+        return self.cache.make_key(
+            article.entry_id, query, self.llm.model, ANALYSIS_PROMPT_VERSION, context=self._context_settings()
+        )
+
+    def has_cached_analysis(self, article: Article, query: str) -> bool:
+        """分析结果是否已在缓存中（命中时无需解析PDF全文）"""
+        return self.cache.get_analysis(self._analysis_key(article, query)) is not None
+
+    def analyze_article(self, article: Article, query: str) -> dict:
+        """生成文章分析内容（优先使用缓存）"""
+        analysis_key = self._analysis_key(article, query)
+        analysis = self.cache.get_analysis(analysis_key)
+        if analysis is None:
+            analysis = article.generate_analysis(query, self.llm)
+            # 全文解析失败时的分析只基于摘要，不缓存，下次重新尝试解析全文
+            if not article.full_text_fallback:
+                self.cache.set_analysis(analysis_key, analysis)
+        return analysis
+
+    def report_path(self, article: Article, output_dir: str, report_type: str = 'pdf') -> str:
+        """单篇文章报告的输出路径"""
+        # 清理文件名，移除可能导致问题的特殊字符
+        safe_id = re.sub(r'[^\w\-_.]', '_', article.entry_id.split('/')[-1])
+        return os.path.join(output_dir, f"report_{safe_id}.{report_type}")
+
+    def export_article_report(self, article: Article, analysis: dict, query: str, template_name: str = 'v1.html',
+                              output_dir: str = None, report_type: str = 'pdf'):
+        """渲染并导出单篇文章报告（优先使用缓存的报告文件）
+
+        Returns:
+            str: 导出成功时返回文件路径，否则返回None
+        """
+        # 使用传入的输出目录或默认目录
+        if not output_dir:
+            output_dir = os.path.abspath("./analysis_report")
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = self.report_path(article, output_dir, report_type)
+
+        artifact_key = self.cache.make_key(
+            article.entry_id, query, self.llm.model, ANALYSIS_PROMPT_VERSION,
+            template=template_name, report_type=report_type, context=self._context_settings()
+        )
+        cached_path = self.cache.get_artifact(artifact_key, report_type)
+        if cached_path:
+            shutil.copyfile(cached_path, output_path)
+            return output_path
+
+        # 生成HTML报告
+        html_report = self.generate_html_report(article, analysis, template_name=template_name)
+
+        # 导出为PNG和PDF
+        if self.submit_export(html_report, output_path, report_type).result():
+            if not article.full_text_fallback:
+                self.cache.put_artifact(artifact_key, report_type, output_path)
+            return output_path
+        return None
+
     def process_article(self, article:Article, query:str, template_name: str = 'v1.html', output_dir: str = None, report_type: str = 'pdf'):
             """处理单篇文章，生成分析报告并导出为图片和PDF
             
@@ -156,30 +242,13 @@ class ArticlePostProcessor:
                 query: 查询字符串
                 template_name: 模板文件名
                 output_dir: 输出目录路径，如果为None则使用默认路径
+                report_type: 'pdf'或'png'，为None时不单独导出（由render_digest统一渲染）
             """
-            # 生成分析内容
-            analysis = article.generate_analysis(query, self.llm)
-            
-            # 使用传入的输出目录或默认目录
-            if not output_dir:
-                output_dir = os.path.abspath("./analysis_report")
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # 清理文件名，移除可能导致问题的特殊字符
-            safe_id = re.sub(r'[^\w\-_.]', '_', article.entry_id.split('/')[-1])
-            png_output_path = os.path.join(output_dir, f"report_{safe_id}.png")
-            pdf_output_path = os.path.join(output_dir, f"report_{safe_id}.pdf")
-            
-            # 生成HTML报告
-            html_report = self.generate_html_report(article, analysis, template_name=template_name)
-            
-            # 导出为PNG和PDF
-            if report_type == 'pdf':
-                self.export_to_pdf(html_report, pdf_output_path)
-            else:
-                self.export_to_image(html_report, png_output_path)
-            
+            analysis = self.analyze_article(article, query)
+            if report_type is not None:
+                self.export_article_report(article, analysis, query, template_name, output_dir, report_type)
             return analysis
+
     def merge_pdfs(self, pdf_files, output_path):
             """
             将多个PDF文件合并成一个PDF文件
@@ -191,6 +260,7 @@ class ArticlePostProcessor:
             返回:
             - bool: 合并是否成功
             """
+            from PyPDF2 import PdfMerger
             try:
                 merger = PdfMerger()
                 
@@ -0,0 +1,152 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from models import Database, BEIJING_TZ
+from utils.logger import Logger
+
+logger = Logger.get_logger('async_database')
+# aiomysql 在首次创建连接池时才导入
+
+
+class AsyncDatabase:
+    """Database的异步版本，基于aiomysql连接池
+
+    SQL与行转换与Database共用，查询语义一致；一个事件循环即可并发服务多个订阅流水线
+    与API请求，不需要为每次数据库调用占用一个线程。连接池绑定到创建它的事件循环。
+    """
+    def __init__(self, db_config, pool_size=None):
+        db_config = dict(db_config)
+        configured_size = db_config.pop('pool_size', 5)
+        db_config.pop('pool_timeout', None)
+        self.pool_size = int(pool_size or configured_size)
+        # mysql.connector与aiomysql的连接参数命名不同
+        self.db_config = {
+            'host': db_config.get('host', 'localhost'),
+            'port': int(db_config.get('port', 3306)),
+            'user': db_config.get('user'),
+            'password': db_config.get('password', ''),
+            'db': db_config.get('database'),
+            'charset': db_config.get('charset', 'utf8mb4'),
+            'autocommit': False,
+        }
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def pool(self):
+        """获取（必要时创建）连接池"""
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    import aiomysql
+                    self._pool = await aiomysql.create_pool(
+                        minsize=1, maxsize=self.pool_size, pool_recycle=3600, **self.db_config
+                    )
+        return self._pool
+
+    @asynccontextmanager
+    async def cursor(self, dictionary=False, commit=False, stream=False):
+        """取出连接并返回游标，退出时关闭游标并归还连接
+
+        Args:
+            dictionary: 是否返回字典形式的行
+            commit: 正常退出时提交事务，异常时回滚
+            stream: 使用无缓冲的服务端游标（SSCursor），逐批读取结果
+        """
+        import aiomysql
+        if stream:
+            cursor_class = aiomysql.SSDictCursor if dictionary else aiomysql.SSCursor
+        else:
+            cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+
+        pool = await self.pool()
+        async with pool.acquire() as conn:
+            cursor = await conn.cursor(cursor_class)
+            try:
+                yield cursor
+                if commit:
+                    await conn.commit()
+            except Exception:
+                if commit:
+                    await conn.rollback()
+                raise
+            finally:
+                await cursor.close()
+
+    async def fetch_all(self, query, params=None, dictionary=True):
+        async with self.cursor(dictionary=dictionary) as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+
+    async def execute(self, query, params=None, many=False):
+        """执行写操作并提交，返回影响的行数"""
+        async with self.cursor(commit=True) as cursor:
+            if many:
+                await cursor.executemany(query, params)
+            else:
+                await cursor.execute(query, params)
+            return cursor.rowcount
+
+    async def stream(self, query, params=None, fetch_size=500, dictionary=True):
+        """用服务端游标逐批读取结果，内存占用与结果集大小无关"""
+        async with self.cursor(dictionary=dictionary, stream=True) as cursor:
+            await cursor.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+
+    async def article_exists(self, entry_id, table_name):
+        query = f"SELECT COUNT(1) FROM {table_name} WHERE entry_id = %s"
+        rows = await self.fetch_all(query, (entry_id,), dictionary=False)
+        return rows[0][0] > 0
+
+    async def fetch_articles_from_db(self, category, limit=100, window=None, profile='report'):
+        """异步获取文章数据，参数与返回值同Database.fetch_articles_from_db
+
+        异步层不做按需加载，未在profile中选取的列保持默认值
+        """
+        query, params = Database.articles_query(category, limit, window, profile)
+        try:
+            rows = await self.fetch_all(query, params)
+        except Exception as e:
+            logger.error(f"数据库错误: {e}")
+            return []
+        return [Database._article_from_row(row, tz=BEIJING_TZ) for row in rows]
+
+    async def fetch_articles_from_db_without_time(self, category, limit=100, profile='report'):
+        """异步获取文章数据，参数与返回值同Database.fetch_articles_from_db_without_time"""
+        query, params = Database.articles_query_without_time(category, limit, profile)
+        rows = await self.fetch_all(query, params)
+        return [Database._article_from_row(row) for row in rows]
+
+    async def fulltext_search(self, keywords, category, limit=100, window=None, profile='filter', title_weight=2.0):
+        """异步全文检索，参数与返回值同Database.fulltext_search"""
+        query, params = Database.fulltext_query(keywords, category, limit, window, profile, title_weight)
+        if query is None:
+            return []
+        try:
+            rows = await self.fetch_all(query, params)
+        except Exception as e:
+            logger.error(f"全文检索出错: {e}")
+            return []
+        articles = []
+        for row in rows:
+            score = row.pop('keyword_score')
+            article = Database._article_from_row(row, tz=BEIJING_TZ)
+            article.keyword_score = float(score or 0)
+            articles.append(article)
+        return articles
+
+    async def iter_articles(self, category, limit=100, window=None, fetch_size=500, profile='report'):
+        """流式逐篇产出窗口内的文章"""
+        query, params = Database.articles_query(category, limit, window, profile)
+        async for row in self.stream(query, params, fetch_size=fetch_size):
+            yield Database._article_from_row(row, tz=BEIJING_TZ)
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
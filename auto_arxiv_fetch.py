@@ -1,11 +1,11 @@
 from datetime import datetime, timedelta, timezone
-import arxiv
 from mysql.connector import Error
 import schedule
 import time
 import json  # 添加json模块导入
 import sys 
 import os
+import threading
 current_dir = os.path.dirname(os.path.abspath(__file__))
 root_dir = os.path.abspath(os.path.join(current_dir, '..'))
 sys.path.insert(0, root_dir)
@@ -14,13 +14,25 @@ from models import Article, Config, Database, LLMModel
 from utils.logger import Logger
 
 logger = Logger.get_logger('auto_arxiv_fetch')
-search_processor = create_search_processor(Config())
+_search_processor = None
+_search_processor_lock = threading.Lock()
+
+
+def get_search_processor():
+    """延迟创建全局SearchProcessor，导入本模块时不再连接任何外部服务"""
+    global _search_processor
+    if _search_processor is None:
+        with _search_processor_lock:
+            if _search_processor is None:
+                _search_processor = create_search_processor(Config())
+    return _search_processor
 
 def fetch_recent_articles(category, max_results=2000):
     """
     获取最近更新的文章列表。通过arXiv API获取指定分类下最新的文章列表。
     使用北京时间确定范围，但转换为GMT时间进行查询。
     """
+    import arxiv
     client = arxiv.Client(
         page_size=100,
         delay_seconds=3,  # 增加请求间隔
@@ -115,7 +127,7 @@ def fetch_process_insert_articles(category, table_name, max_results):
         logger.info(f"成功存储{len(new_articles)}篇新文章到数据库中。")
         # 将新文章插入统一的向量数据库
         for article in new_articles:
-            search_processor.insert_article_to_vector_db(article)
+            get_search_processor().insert_article_to_vector_db(article)
         logger.info(f"成功存储{len(new_articles)}篇新文章到向量数据库中。")
     else:
         logger.info("没有新的文章需要更新。")
@@ -184,18 +196,10 @@ def insert_articles_to_database(category, articles, table_name):
     config = Config()
     db = Database(config.db_config())
 
-    # try:
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.executemany(insert_query, records)
-    conn.commit()
-    logger.info(f"{cursor.rowcount} records inserted.")
-    # except Error as e:
-    #     print(f"数据库插入错误: {e}")
-    #     conn.rollback()
-    # finally:
-    #     cursor.close()
-    #     conn.close()
+    # 连接来自共享连接池，退出时提交并归还连接，出错时回滚
+    with db.cursor(commit=True) as cursor:
+        cursor.executemany(insert_query, records)
+        logger.info(f"{cursor.rowcount} records inserted.")
 
 def daily_task():
     """
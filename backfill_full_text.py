@@ -0,0 +1,138 @@
+"""
+离线回填arxiv_daily.full_text：导出缺少全文的文章清单，使用scipdf批量解析PDF，
+再把解析结果写回数据库，不经过实时报告流程。
+
+用法:
+    python backfill_full_text.py manifest backfill/manifest.jsonl --limit 5000
+    python backfill_full_text.py parse backfill/manifest.jsonl backfill/shards --workers 8
+    python backfill_full_text.py load backfill/shards
+    python backfill_full_text.py run backfill --limit 5000     # 依次执行以上三步
+"""
+import argparse
+import json
+import os
+
+from models import Article, Config, Database
+from scipdf.pdf.bulk_parse import parse_pdf_corpus, read_manifest, iter_shard_records
+from utils.logger import Logger
+
+logger = Logger.get_logger('backfill_full_text')
+
+# full_text为TEXT列，最多65535字节
+FULL_TEXT_MAX_BYTES = 65535
+
+
+def export_manifest(manifest_path, table_name, limit=None):
+    """导出full_text为空的文章到JSONL清单，返回导出数量"""
+    db = Database(Config().db_config())
+    query = f"SELECT entry_id FROM {table_name} WHERE full_text IS NULL ORDER BY published DESC"
+    params = ()
+    if limit:
+        query += " LIMIT %s"
+        params = (limit,)
+
+    with db.cursor() as cursor:
+        cursor.execute(query, params)
+        entry_ids = [row[0] for row in cursor.fetchall()]
+
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        for entry_id in entry_ids:
+            f.write(json.dumps({"id": entry_id, "pdf": Article(entry_id=entry_id).pdf_url}) + "\n")
+    logger.info(f"导出{len(entry_ids)}篇缺少全文的文章到: {manifest_path}")
+    return len(entry_ids)
+
+
+def _truncate_utf8(text, max_bytes=FULL_TEXT_MAX_BYTES):
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', errors='ignore')
+
+
+def load_shards(shard_dir, table_name, batch_size=200):
+    """将解析结果写回数据库，只更新full_text仍为空的行，返回更新行数"""
+    db = Database(Config().db_config())
+    update_query = f"UPDATE {table_name} SET full_text = %s WHERE entry_id = %s AND full_text IS NULL"
+
+    updated = 0
+    # 分批提交，长时间运行时只占用连接池中的一个连接
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        batch = []
+        for record in iter_shard_records(shard_dir):
+            full_text = _truncate_utf8(Article.format_sections(record["sections"]))
+            batch.append((full_text, record["id"]))
+            if len(batch) >= batch_size:
+                cursor.executemany(update_query, batch)
+                conn.commit()
+                updated += cursor.rowcount
+                batch = []
+        if batch:
+            cursor.executemany(update_query, batch)
+            conn.commit()
+            updated += cursor.rowcount
+        cursor.close()
+    finally:
+        conn.close()
+    logger.info(f"成功回填{updated}篇文章的full_text")
+    return updated
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description="离线回填arxiv_daily的full_text")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    manifest_parser = subparsers.add_parser("manifest", help="导出缺少全文的文章清单")
+    manifest_parser.add_argument("manifest_path")
+    manifest_parser.add_argument("--limit", type=int)
+
+    parse_parser = subparsers.add_parser("parse", help="批量解析清单中的PDF")
+    parse_parser.add_argument("manifest_path")
+    parse_parser.add_argument("shard_dir")
+
+    load_parser = subparsers.add_parser("load", help="将解析结果写回数据库")
+    load_parser.add_argument("shard_dir")
+
+    run_parser = subparsers.add_parser("run", help="依次执行manifest、parse、load")
+    run_parser.add_argument("work_dir")
+    run_parser.add_argument("--limit", type=int)
+
+    for sub in (parse_parser, run_parser):
+        sub.add_argument("--backend", choices=("grobid", "local", "auto"), default="auto")
+        sub.add_argument("--workers", type=int, default=4)
+        sub.add_argument("--shard-size", type=int, default=500)
+
+    args = parser.parse_args()
+    table_name = config.articles_table() or 'arxiv_daily'
+
+    if args.command == "manifest":
+        export_manifest(args.manifest_path, table_name, args.limit)
+    elif args.command == "load":
+        load_shards(args.shard_dir, table_name)
+    else:
+        if args.command == "run":
+            manifest_path = os.path.join(args.work_dir, "manifest.jsonl")
+            shard_dir = os.path.join(args.work_dir, "shards")
+            export_manifest(manifest_path, table_name, args.limit)
+        else:
+            manifest_path, shard_dir = args.manifest_path, args.shard_dir
+
+        stats = parse_pdf_corpus(
+            read_manifest(manifest_path),
+            shard_dir,
+            backend=args.backend,
+            grobid_urls=json.loads(config.grobid_urls()),
+            n_workers=args.workers,
+            shard_size=args.shard_size,
+        )
+        logger.info(f"解析完成: {stats}")
+
+        if args.command == "run":
+            load_shards(shard_dir, table_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+导入耗时基准：在独立的子进程中逐个导入入口模块，统计 ``-X importtime``
+报告的累计耗时，超过预算时以非零状态码退出，用于防止重型依赖重新回到导入路径。
+
+用法:
+    python benchmarks/import_time.py              # 使用默认预算
+    python benchmarks/import_time.py --budget 0.3 models search_engine
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_MODULES = [
+    "models",
+    "search_engine",
+    "articles_processor",
+    "auto_arxiv_fetch",
+    "main_local",
+    "search_query_handler",
+    "scipdf",
+]
+
+# 这些依赖只允许在首次使用时导入
+HEAVY_MODULES = ["spacy", "pandas", "textstat", "pymilvus", "openai", "fitz", "pdfkit", "imgkit", "PyPDF2", "arxiv"]
+
+_IMPORTTIME_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module, runs=3):
+    """返回 (最小累计耗时秒数, 被导入的重型依赖列表)"""
+    best, heavy = None, []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT_DIR, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{result.stderr.strip().splitlines()[-1]}")
+        cumulative, imported = None, set()
+        for line in result.stderr.splitlines():
+            match = _IMPORTTIME_PATTERN.match(line)
+            if not match:
+                continue
+            name = match.group(4)
+            imported.add(name.split('.')[0])
+            if name == module and len(match.group(3)) == 1:
+                cumulative = int(match.group(2)) / 1e6
+        if cumulative is not None and (best is None or cumulative < best):
+            best = cumulative
+        heavy = sorted(imported & set(HEAVY_MODULES))
+    return best or 0.0, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口模块导入耗时基准")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget", type=float, default=0.5, help="单个模块导入耗时上限（秒）")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        try:
+            seconds, heavy = measure_import(module, runs=args.runs)
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            failed = True
+            continue
+        over_budget = seconds > args.budget
+        status = "FAIL" if over_budget or heavy else "OK"
+        failed = failed or status == "FAIL"
+        extra = f"  重型依赖: {', '.join(heavy)}" if heavy else ""
+        print(f"[{status}] {module:<22} {seconds * 1000:8.1f} ms{extra}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import math
+import threading
+from array import array
+from collections import Counter
+
+from utils.text import tokenize
+
+
+class BM25Index:
+    """文章标题+摘要（可选中文标题与摘要）的进程内BM25倒排索引
+
+    文章逐篇增量加入；每个词项的倒排表由两个紧凑数组组成（文档编号array('I')与词频array('H')），
+    文档长度同样存放在数组中。删除只做标记，被删除的文档超过一半时整体压缩。
+    分词与context_builder相同（utils.text.tokenize：英文单词、中文二元组），查询时只遍历
+    查询词项的倒排表，与文章总数无关。
+    """
+    def __init__(self, k1=1.5, b=0.75, include_cn=False):
+        self.k1 = k1
+        self.b = b
+        self.include_cn = include_cn
+        self._postings = {}  # term -> (array('I') 文档编号, array('H') 词频)
+        self._entry_ids = []  # 文档编号 -> entry_id
+        self._doc_ids = {}  # entry_id -> 文档编号
+        self._lengths = array('I')
+        self._deleted = set()
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._doc_ids
+
+    def _document_text(self, title, summary, CN_title=None, CN_summary=None):
+        parts = [title or "", summary or ""]
+        if self.include_cn:
+            parts += [CN_title or "", CN_summary or ""]
+        return " ".join(parts)
+
+    def add(self, entry_id, title, summary, CN_title=None, CN_summary=None):
+        """加入一篇文章；已在索引中的文章忽略"""
+        counts = Counter(tokenize(self._document_text(title, summary, CN_title, CN_summary)))
+        with self._lock:
+            if entry_id in self._doc_ids:
+                return
+            doc_id = len(self._entry_ids)
+            self._entry_ids.append(entry_id)
+            self._doc_ids[entry_id] = doc_id
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._total_length += length
+            for term, tf in counts.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array('I'), array('H'))
+                posting[0].append(doc_id)
+                posting[1].append(min(tf, 0xFFFF))
+
+    def add_article(self, article):
+        """加入Article或ArticleRecord；不索引中文字段时不访问它们，避免触发按需加载"""
+        if self.include_cn:
+            self.add(article.entry_id, article.title, article.summary,
+                     getattr(article, 'CN_title', None), getattr(article, 'CN_summary', None))
+        else:
+            self.add(article.entry_id, article.title, article.summary)
+
+    def remove(self, entry_id):
+        """从索引中移除一篇文章（标记删除）"""
+        with self._lock:
+            doc_id = self._doc_ids.pop(entry_id, None)
+            if doc_id is None:
+                return
+            self._deleted.add(doc_id)
+            self._total_length -= self._lengths[doc_id]
+            if len(self._deleted) * 2 > len(self._entry_ids):
+                self._compact()
+
+    def _compact(self):
+        """丢弃被删除的文档，重新编号"""
+        remap = array('I', [0]) * len(self._entry_ids)
+        entry_ids, lengths = [], array('I')
+        for doc_id, entry_id in enumerate(self._entry_ids):
+            if doc_id in self._deleted:
+                continue
+            remap[doc_id] = len(entry_ids)
+            entry_ids.append(entry_id)
+            lengths.append(self._lengths[doc_id])
+
+        postings = {}
+        for term, (docs, tfs) in self._postings.items():
+            new_docs, new_tfs = array('I'), array('H')
+            for doc_id, tf in zip(docs, tfs):
+                if doc_id not in self._deleted:
+                    new_docs.append(remap[doc_id])
+                    new_tfs.append(tf)
+            if new_docs:
+                postings[term] = (new_docs, new_tfs)
+
+        self._postings = postings
+        self._entry_ids = entry_ids
+        self._doc_ids = {entry_id: doc_id for doc_id, entry_id in enumerate(entry_ids)}
+        self._lengths = lengths
+        self._deleted = set()
+
+    def search(self, keywords, candidates=None, limit=None):
+        """按BM25为命中任一查询词项的文章打分
+
+        Args:
+            keywords: 关键词列表（或查询字符串）
+            candidates: 提供时只在这些entry_id中检索
+            limit: 最多返回的结果数
+
+        Returns:
+            list[tuple[str, float]]: (entry_id, 得分)，按得分降序
+        """
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        terms = set(tokenize(" ".join(keywords or [])))
+        with self._lock:
+            n_docs = len(self._doc_ids)
+            if not terms or not n_docs:
+                return []
+            avg_length = (self._total_length / n_docs) or 1.0
+            allowed = None
+            if candidates is not None:
+                allowed = {self._doc_ids[entry_id] for entry_id in candidates if entry_id in self._doc_ids}
+
+            scores = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                docs, tfs = posting
+                doc_freq = len(docs) - (sum(1 for doc_id in docs if doc_id in self._deleted) if self._deleted else 0)
+                if not doc_freq:
+                    continue
+                idf = math.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+                for doc_id, tf in zip(docs, tfs):
+                    if doc_id in self._deleted or (allowed is not None and doc_id not in allowed):
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            if limit:
+                ranked = ranked[:limit]
+            return [(self._entry_ids[doc_id], score) for doc_id, score in ranked]
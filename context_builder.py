@@ -0,0 +1,139 @@
+import math
+import re
+from collections import Counter
+
+from utils.text import tokenize, estimate_tokens
+
+# 与LLM_analysis中四项技能（总结、相关性、创新点、评分）对应的检索词，
+# 用于在用户查询之外为方法、实验、结论类内容加权
+SKILL_TERMS = (
+    "propose proposed method approach framework model architecture algorithm "
+    "experiment experiments evaluation benchmark dataset results baseline outperform "
+    "improvement contribution contributions novel conclusion limitation "
+    "提出 方法 实验 结果 结论 贡献 创新"
+)
+
+# 按章节标题调整权重：摘要/引言/结论几乎总是有用，相关工作、附录等优先级最低
+HEADING_WEIGHTS = (
+    (re.compile(r"abstract|introduction|conclusion|summary|discussion", re.I), 1.5),
+    (re.compile(r"method|approach|experiment|result|evaluation|analysis", re.I), 1.2),
+    (re.compile(r"related work|background|preliminar", re.I), 0.6),
+    (re.compile(r"appendix|acknowledg|reference|supplementary|checklist", re.I), 0.2),
+)
+
+
+class AnalysisContextBuilder:
+    """为LLM_analysis构造受token预算约束的正文上下文
+
+    将解析出的章节切成若干块，用BM25对块与（用户查询 + 技能检索词）打分，
+    按得分从高到低装入token预算，最后按原文顺序拼接输出。
+    """
+    def __init__(self, token_budget=12000, chunk_tokens=600, k1=1.5, b=0.75):
+        self.token_budget = token_budget
+        self.chunk_tokens = chunk_tokens
+        self.k1 = k1
+        self.b = b
+
+    def split_sections(self, sections):
+        """将章节切分为不超过chunk_tokens的块，按段落边界切分"""
+        chunks = []
+        for section_index, section in enumerate(sections):
+            heading = (section.get('heading') or '').strip()
+            paragraphs = [p.strip() for p in (section.get('text') or '').split('\n') if p.strip()]
+            buffer, buffer_tokens = [], 0
+            for paragraph in paragraphs:
+                paragraph_tokens = estimate_tokens(paragraph)
+                if buffer and buffer_tokens + paragraph_tokens > self.chunk_tokens:
+                    chunks.append(self._make_chunk(section_index, heading, buffer, buffer_tokens))
+                    buffer, buffer_tokens = [], 0
+                buffer.append(paragraph)
+                buffer_tokens += paragraph_tokens
+            if buffer:
+                chunks.append(self._make_chunk(section_index, heading, buffer, buffer_tokens))
+        return chunks
+
+    @staticmethod
+    def _make_chunk(section_index, heading, paragraphs, n_tokens):
+        return {
+            "section_index": section_index,
+            "heading": heading,
+            "text": "\n".join(paragraphs),
+            "tokens": n_tokens,
+        }
+
+    def score_chunks(self, chunks, query):
+        """使用BM25为每个块打分，并按章节标题加权"""
+        query_terms = set(tokenize(query)) | set(tokenize(SKILL_TERMS))
+        if not chunks or not query_terms:
+            return [0.0] * len(chunks)
+
+        term_counts = [Counter(tokenize(f"{c['heading']} {c['text']}")) for c in chunks]
+        doc_lengths = [sum(tc.values()) for tc in term_counts]
+        avg_length = (sum(doc_lengths) / len(doc_lengths)) or 1.0
+        n_docs = len(chunks)
+        doc_freq = Counter(term for tc in term_counts for term in tc if term in query_terms)
+
+        scores = []
+        for chunk, tc, length in zip(chunks, term_counts, doc_lengths):
+            score = 0.0
+            for term in query_terms:
+                tf = tc.get(term)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                score += idf * tf * (self.k1 + 1) / norm
+            scores.append(score * self._heading_weight(chunk['heading']))
+        return scores
+
+    @staticmethod
+    def _heading_weight(heading):
+        for pattern, weight in HEADING_WEIGHTS:
+            if pattern.search(heading):
+                return weight
+        return 1.0
+
+    def build(self, sections, query, reserved_tokens=0):
+        """在token预算内选择最相关的块
+
+        Args:
+            sections (list[dict]): 解析出的章节，每项包含heading和text
+            query (str): 用户查询
+            reserved_tokens (int): 预算中已被提示词其他部分占用的token数
+
+        Returns:
+            tuple[str, list[dict]]: 拼接后的正文，以及每个被使用章节的
+                heading、使用块数、总块数和token数
+        """
+        chunks = self.split_sections(sections)
+        budget = max(self.token_budget - reserved_tokens, 0)
+        scores = self.score_chunks(chunks, query)
+
+        selected, used_tokens = set(), 0
+        for index in sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True):
+            if used_tokens + chunks[index]['tokens'] > budget:
+                continue
+            selected.add(index)
+            used_tokens += chunks[index]['tokens']
+
+        used_sections = {}
+        parts, current_section = [], None
+        for index, chunk in enumerate(chunks):
+            section_info = used_sections.setdefault(chunk['section_index'], {
+                "heading": chunk['heading'],
+                "chunks_used": 0,
+                "chunks_total": 0,
+                "tokens": 0,
+            })
+            section_info["chunks_total"] += 1
+            if index not in selected:
+                continue
+            section_info["chunks_used"] += 1
+            section_info["tokens"] += chunk['tokens']
+            if chunk['section_index'] != current_section:
+                parts.append(f"## {chunk['heading']}")
+                current_section = chunk['section_index']
+            parts.append(chunk['text'])
+
+        context = '\n\n'.join(parts)
+        return context, [info for info in used_sections.values() if info["chunks_used"] > 0]
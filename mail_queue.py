@@ -0,0 +1,243 @@
+import email
+import heapq
+import itertools
+import os
+import queue
+import smtplib
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from email import policy
+
+from utils.logger import Logger
+
+logger = Logger.get_logger('mail_queue')
+
+
+class SMTPPool:
+    """已认证SMTP会话池
+
+    会话在多封邮件之间复用，取出时用NOOP检查连接是否仍然可用，失效则重新建立；
+    发送出错的会话直接丢弃。STARTTLS与登录都是可选的，便于对接aiosmtpd等本地测试服务器。
+    """
+    def __init__(self, host, port, username=None, password=None, starttls=True, use_ssl=False,
+                 size=2, timeout=30):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.starttls and not self.use_ssl:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _alive(server):
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @contextmanager
+    def session(self):
+        """取出一个可用会话，正常退出时放回池中，出错时关闭"""
+        with self._slots:
+            server = None
+            while server is None:
+                try:
+                    server = self._idle.get_nowait()
+                except queue.Empty:
+                    server = self._connect()
+                    break
+                if not self._alive(server):
+                    self._close(server)
+                    server = None
+            try:
+                yield server
+            except Exception:
+                self._close(server)
+                raise
+            else:
+                self._idle.put(server)
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+class MailQueue:
+    """持久化的邮件发送队列
+
+    enqueue先把邮件原文写入spool目录再交给后台线程发送，发送成功后删除；
+    失败按指数退避重试，超过max_retries移入spool/failed。进程重启时会重新加载
+    spool中未发送的邮件，因此入队成功即视为已投递。
+    """
+    def __init__(self, pool, spool_dir='./mail_spool', workers=2, max_retries=5, retry_backoff=30):
+        self.pool = pool
+        self.spool_dir = os.path.abspath(spool_dir)
+        self.failed_dir = os.path.join(self.spool_dir, 'failed')
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+        self._heap = []  # (ready_at, seq, path, attempts)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._inflight = 0
+        self.sent = 0
+        self.failed = 0
+
+        self.recover()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f'mail-queue-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def recover(self):
+        """重新加载spool目录中上次未发送完的邮件"""
+        pending = sorted(
+            (os.path.join(self.spool_dir, name) for name in os.listdir(self.spool_dir) if name.endswith('.eml')),
+            key=os.path.getmtime
+        )
+        for path in pending:
+            self._push(path, 0, 0)
+        if pending:
+            logger.info(f"从spool恢复 {len(pending)} 封未发送邮件")
+
+    def enqueue(self, msg):
+        """持久化邮件并加入发送队列
+
+        Returns:
+            str: spool中的文件路径
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.spool_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(msg.as_bytes())
+            f.flush()
+            os.fsync(f.fileno())
+        path = os.path.join(self.spool_dir, f"{time.time_ns()}-{uuid.uuid4().hex}.eml")
+        os.replace(tmp_path, path)
+        self._push(path, 0, 0)
+        return path
+
+    def _push(self, path, ready_at, attempts):
+        with self._cond:
+            heapq.heappush(self._heap, (ready_at, next(self._seq), path, attempts))
+            self._cond.notify()
+
+    def _next(self):
+        """取出下一封到期的邮件，队列关闭且为空时返回None"""
+        with self._cond:
+            while True:
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        self._inflight += 1
+                        return heapq.heappop(self._heap)
+                elif self._closed:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+
+    def _worker(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            _, _, path, attempts = item
+            try:
+                self._send(path)
+            except Exception as e:
+                try:
+                    self._retry(path, attempts + 1, e)
+                except Exception as retry_error:
+                    logger.error(f"安排重试时出错，放弃该邮件 {path}: {retry_error}")
+            else:
+                self.sent += 1
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    # 已发送成功，删除失败只记录，不能重试（否则会重复发送）
+                    logger.error(f"删除已发送邮件的spool文件失败 {path}: {e}")
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+                    self._cond.notify_all()
+
+    def _send(self, path):
+        with open(path, 'rb') as f:
+            msg = email.message_from_binary_file(f, policy=policy.default)
+        with self.pool.session() as server:
+            server.send_message(msg)
+        logger.info(f"邮件已发送至 {msg['To']}")
+
+    def _retry(self, path, attempts, error):
+        if attempts > self.max_retries:
+            self.failed += 1
+            try:
+                os.makedirs(self.failed_dir, exist_ok=True)
+                os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+            except OSError as e:
+                # 不能让异常结束工作线程，否则队列会静默停止发送
+                logger.error(f"邮件发送失败 {attempts} 次，移入 {self.failed_dir} 时出错: {e}（发送错误: {error}）")
+                return
+            logger.error(f"邮件发送失败 {attempts} 次，已移入 {self.failed_dir}: {error}")
+            return
+        if not os.path.exists(path):
+            logger.error(f"邮件发送失败且spool文件已不存在，放弃重试: {path}: {error}")
+            self.failed += 1
+            return
+        delay = self.retry_backoff * 2 ** (attempts - 1)
+        logger.warning(f"邮件发送失败（第 {attempts} 次），{delay} 秒后重试: {error}")
+        self._push(path, time.monotonic() + delay, attempts)
+
+    def join(self, timeout=None):
+        """等待当前已到期的邮件发送完毕（退避中的邮件不等待）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._inflight or (self._heap and self._heap[0][0] <= time.monotonic()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 1)
+        return True
+
+    def close(self, wait=True):
+        """停止接收新邮件；未发送的邮件保留在spool中，下次启动时继续发送"""
+        with self._cond:
+            self._closed = True
+            self._heap = [item for item in self._heap if item[0] <= time.monotonic()] if wait else []
+            heapq.heapify(self._heap)
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        self.pool.close()
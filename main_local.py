@@ -3,11 +3,16 @@ import os
 from models import Config, LLMModel
 from search_engine import SearchProcessor
 from articles_processor import ArticlePostProcessor
+from analysis_pipeline import ArticlePipeline
+from ranking import ArticleRanker
+from subscription_scheduler import SubscriptionScheduler
+from push_planner import DigestOutbox, PushPlanner
 from utils.logger import Logger
 import re
 import schedule
+import threading
 import time
-import smtplib
+from mail_queue import MailQueue, SMTPPool
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
@@ -21,18 +26,78 @@ class ArxivAnalyzer:
         self.model = LLMModel()
         self.search_processor = SearchProcessor(self.config.db_config(), self.model)
         self.post_processor = ArticlePostProcessor(LLMModel(model='deepseek-r1'))
+        self.pipeline = ArticlePipeline(
+            self.model,
+            self.post_processor,
+            io_workers=self.config.pipeline_io_workers(),
+            llm_workers=self.config.pipeline_llm_workers()
+        )
+        ranking_config = self.config.ranking_config()
+        self.ranker = ArticleRanker(
+            weight_vector=ranking_config['weight_vector'],
+            weight_llm=ranking_config['weight_llm'],
+            weight_recency=ranking_config['weight_recency'],
+            recency_half_life_hours=ranking_config['recency_half_life_hours'],
+            context_token_budget=self.config.context_token_budget()
+        )
+        self._mail_queue = None
+        self._mail_queue_lock = threading.Lock()
+
+    @property
+    def mail_queue(self):
+        """延迟创建邮件发送队列，所有订阅共享同一组SMTP会话"""
+        if self._mail_queue is None:
+            with self._mail_queue_lock:
+                if self._mail_queue is None:
+                    email_config = self.config.email_config()
+                    queue_config = self.config.mail_queue_config()
+                    pool = SMTPPool(
+                        email_config.get('smtp_server'),
+                        email_config.get('smtp_port'),
+                        username=email_config.get('sender_email'),
+                        password=email_config.get('sender_password'),
+                        starttls=queue_config['starttls'],
+                        use_ssl=queue_config['use_ssl'],
+                        size=queue_config['pool_size']
+                    )
+                    self._mail_queue = MailQueue(
+                        pool,
+                        spool_dir=queue_config['spool_dir'],
+                        workers=queue_config['pool_size'],
+                        max_retries=queue_config['max_retries'],
+                        retry_backoff=queue_config['retry_backoff']
+                    )
+        return self._mail_queue
         
-    def process_query(self, query: str, category: str, send_to_email: bool = False, max_results: int = 50):
+    def process_query(self, query: str, category: str, send_to_email: bool = False, max_results: int = 50,
+                      articles=None, output_dir: str = None, recipient_email: str = None,
+                      cluster=None, verdict_cache=None, keywords=None, query_vector=None, window=None):
+
+        """处理用户查询并分析论文
+
+        Args:
+            articles: 预先获取的候选文章（如调度器共享的当日文章快照），为None时从数据库获取
+            output_dir: 报告输出目录，为None时按当前时间创建
+            recipient_email: 合并报告的收件人
+            cluster: 查询所在的QueryCluster，与verdict_cache一起用于复用同簇订阅的LLM判断
+            keywords, query_vector: 订阅预先计算并持久化的关键词与关键词embedding
+            window: 发布时间窗口 (start, end)，MySQL获取与向量检索共用，默认按[window] days配置
 
-        """处理用户查询并分析论文"""
+        Returns:
+            dict: ranked为[(Article, 综合得分)]（深度分析的文章在前），merged_report为合并报告路径，
+                delivered表示合并报告是否已成功发送
+        """
         logger.info(f"\n开始处理查询: {query}")
         logger.info(f"类别: {category if category else '所有类别'}")
+        result = {"ranked": [], "merged_report": None, "output_dir": output_dir, "delivered": False}
+        window = window or self.search_processor.published_window()
         
         # 获取最新文章
-        articles = self.search_processor.fetch_articles_from_db(category, limit=max_results)
+        if articles is None:
+            articles = self.search_processor.fetch_articles_from_db(category, limit=max_results, window=window)
         if not articles:
             logger.info("未获取到任何文章")
-            return
+            return result
             
         logger.info(f"获取到 {len(articles)} 篇文章")
         
@@ -45,78 +110,99 @@ class ArxivAnalyzer:
         #     print("未找到相关文章")
         #     return
             
-        # 第一阶段：embedding过滤
-        embedding_filtered, keywords = self.search_processor.embedding_filter(query, articles, category)
-        logger.info(f"\nEmbedding过滤后剩余: {len(embedding_filtered)} 篇文章")
+        # 第一阶段：embedding过滤；hybrid模式下关键词与向量检索并行执行并做RRF融合
+        if self.config.retrieval_config()['mode'] == 'hybrid':
+            candidate_filter = self.search_processor.hybrid_filter
+        else:
+            candidate_filter = self.search_processor.embedding_filter
+        embedding_filtered, keywords = candidate_filter(
+            query, articles, category, keywords=keywords, query_vector=query_vector, window=window
+        )
+        logger.info(f"\n候选召回后剩余: {len(embedding_filtered)} 篇文章")
         logger.info(f"关键词: {keywords}")
         # logger.info(f"embedding_filtered: {embedding_filtered}")
         for i in embedding_filtered:
             logger.info(i.title)
         if not embedding_filtered:
             logger.info("未找到相关文章")
-            return
+            return result
             
         # 第二阶段：LLM精确判断
-        final_articles = self.search_processor.llm_filter(query, embedding_filtered, keywords)
+        final_articles = self.search_processor.llm_filter(
+            query, embedding_filtered, keywords, cluster=cluster, verdict_cache=verdict_cache
+        )
         logger.info(f"\nLLM过滤后最终剩余: {len(final_articles)} 篇文章")
         for i in final_articles:
             logger.info(i.title)
         
         if not final_articles:
             logger.info("未找到相关文章")
-            return
+            return result
+
+        # 第三阶段：综合排序，只对预算内的文章做全文深度分析，其余只生成摘要概括
+        ranking_config = self.config.ranking_config()
+        final_articles, overflow_articles = self.ranker.select(
+            final_articles,
+            max_articles=ranking_config['max_articles'],
+            max_tokens=ranking_config['max_tokens']
+        )
+        logger.info(f"排序后深度分析 {len(final_articles)} 篇，摘要概括 {len(overflow_articles)} 篇")
+        # 入选文章的作者、中文翻译等报告列一次性批量取回；全文等大文本列仍在解析时逐篇按需加载
+        self.search_processor.db.preload_columns(final_articles + overflow_articles)
+        digest_mode = self.config.digest_mode()
+        # 摘要概括只在合并报告中渲染，非合并模式下不调用LLM生成
+        if digest_mode:
+            self.pipeline.run_briefs(overflow_articles, query)
             
         # 生成分析报告
         logger.info("\n开始生成分析报告...")
         # 创建以当前时间命名的输出目录
-        current_time = datetime.now().strftime('%Y%m%d_%H%M')
-        output_dir = os.path.join(os.getcwd(), "analysis_report", current_time)
+        if output_dir is None:
+            current_time = datetime.now().strftime('%Y%m%d_%H%M')
+            output_dir = os.path.join(os.getcwd(), "analysis_report", current_time)
         os.makedirs(output_dir, exist_ok=True)
+        result["output_dir"] = output_dir
+        result["ranked"] = [
+            (article, getattr(article, 'rank_score', None)) for article in final_articles + overflow_articles
+        ]
         
-        pdf_files = []
-        for i, article in enumerate(final_articles, 1):
-            logger.info(f"\n处理第 {i} 篇文章: {article.title}")
-            try:
-                # 翻译文章标题和摘要内容
-                article.translate_content(self.model)
-                # 解析pdf内容
-                article._parse_pdf_content()
-                # 生成分析报告
-                self.post_processor.process_article(
-                    article, 
-                    query,
-                    template_name='v1.html',
-                    output_dir=output_dir  # 传递输出目录到process_article方法
-                )
-                
-                # 收集PDF文件路径
-                # safe_id = article.entry_id.split('/')[-1].replace('.', '_')
-                safe_id = re.sub(r'[^\w\-_.]', '_', article.entry_id.split('/')[-1])
-                pdf_path = os.path.join(output_dir, f"report_{safe_id}.pdf")
-        
-                logger.info(pdf_path)
-                if os.path.exists(pdf_path):
-                    pdf_files.append(pdf_path)
-                    
-            except Exception as e:
-                logger.error(f"处理文章时出错: {e}")
-                continue
-        logger.info(pdf_files)
-        # 合并所有PDF文件，保存在同一时间目录下
-        if len(pdf_files) > 1:
-            merged_pdf_path = os.path.join(output_dir, f"merged_report.pdf")
-            self.post_processor.merge_pdfs(pdf_files, merged_pdf_path)
+        # 合并模式下默认不再逐篇导出PDF，由render_digest一次性渲染
+        report_type = 'pdf' if (not digest_mode or self.config.per_article_reports()) else None
+
+        # 翻译/解析、深度分析、渲染三个阶段并发执行，结果按原顺序返回
+        results = self.pipeline.run(
+            final_articles,
+            query,
+            template_name='v1.html',
+            output_dir=output_dir,
+            report_type=report_type
+        )
+        reports = [(result.article, result.analysis) for result in results if result.ok]
+        pdf_files = [result.report_path for result in results if result.ok and result.report_path]
+        merged_pdf_path = os.path.join(output_dir, f"merged_report.pdf")
+        merged = False
+        if digest_mode:
+            # 所有文章渲染到同一个HTML文档，只启动一次wkhtmltopdf
+            merged = self.post_processor.render_digest(
+                reports, merged_pdf_path, template_name='v1.html', briefs=overflow_articles
+            )
+        elif len(pdf_files) > 1:
+            logger.info(pdf_files)
+            # 合并所有PDF文件，保存在同一时间目录下
+            merged = self.post_processor.merge_pdfs(pdf_files, merged_pdf_path)
+
+        if merged:
             logger.info(f"\n已生成合并报告: {merged_pdf_path}")
             
+            result["merged_report"] = merged_pdf_path
+            
             # 发送合并报告到邮箱
             if send_to_email:
                 logger.info("发送合并报告到邮箱")
-                # if hasattr(self.config, 'email_config') and self.config.email_config():
-                #     # 假设用户邮箱通过某种方式获取
-                #     user_email = self.config.email_config().get('user_email')  
-                #     self.send_report_email(merged_pdf_path, query, user_email)
+                result["delivered"] = self.send_report_email(merged_pdf_path, query, recipient_email)
             
         logger.info(f"\n所有报告已保存到目录: {output_dir}")
+        return result
 
 
 
@@ -127,26 +213,29 @@ class ArxivAnalyzer:
             pdf_path: PDF报告的路径
             query_topic: 查询主题
             recipient_email: 收件人邮箱，如果为None则尝试从配置中获取
+
+        Returns:
+            bool: 是否已加入发送队列（邮件已持久化，由队列负责发送与重试）
         """
         try:
             email_config = self.config.email_config()
             if not email_config:
                 logger.info("未找到邮箱配置，跳过邮件发送")
-                return
+                return False
             
             # 提取邮箱配置
             smtp_server = email_config.get('smtp_server')
             smtp_port = email_config.get('smtp_port')
             sender_email = email_config.get('sender_email')
-            sender_password = email_config.get('sender_password')
         
             # 如果没有提供收件人邮箱，尝试从配置中获取
             if recipient_email is None:
                 recipient_email = email_config.get('recipient_email')
         
-            if not all([smtp_server, smtp_port, sender_email, sender_password, recipient_email]):
+            # 密码可以为空：连接本地调试服务器时不登录
+            if not all([smtp_server, smtp_port, sender_email, recipient_email]):
                 logger.info("邮箱配置不完整或未提供收件人邮箱，跳过邮件发送")
-                return
+                return False
             
             # 创建邮件
             msg = MIMEMultipart()
@@ -170,16 +259,26 @@ class ArxivAnalyzer:
                 attachment.add_header('Content-Disposition', 'attachment', filename=os.path.basename(pdf_path))
                 msg.attach(attachment)
         
-            # 发送邮件
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls()  # 启用TLS加密
-                server.login(sender_email, sender_password)
-                server.send_message(msg)
+            # 写入发送队列，由后台线程复用SMTP会话发送，不阻塞分析线程
+            self.mail_queue.enqueue(msg)
             
-            logger.info(f"报告已成功发送至邮箱: {recipient_email}")
+            logger.info(f"报告已加入发送队列: {recipient_email}")
+            return True
         
         except Exception as e:
             logger.error(f"发送邮件时出错: {e}")
+            return False
+
+_analyzer = None
+
+
+def get_analyzer():
+    """所有定时任务共享同一个ArxivAnalyzer，避免每次运行重新创建客户端与渲染环境"""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = ArxivAnalyzer()
+    return _analyzer
+
 
 def scheduled_task():
     config = Config()
@@ -190,8 +289,8 @@ def scheduled_task():
     category = query_config['category']
     max_results = config.max_results()
     
-    # 初始化分析器并处理
-    analyzer = ArxivAnalyzer()
+    # 使用共享的分析器处理
+    analyzer = get_analyzer()
     analyzer.process_query(query, category, send_to_email=False, max_results=max_results)
     logger.info(f"{datetime.now()} - 定时任务完成")
 
@@ -200,10 +299,28 @@ def scheduled_task():
 if __name__ == "__main__":
     # scheduled_task()
     config = Config()
-    work_time = config.work_time()['push_hour']
-    logger.info(f"{datetime.now()} - 定时任务已设置,将在每天{work_time}点运行")
-    # 设置定时任务,每天凌晨运行一次
-    schedule.every().day.at(work_time).do(scheduled_task)
+    if config.multi_tenant_enabled():
+        # 多用户模式：按search_requests表中每个订阅的推送时间分组运行
+        scheduler = SubscriptionScheduler(
+            get_analyzer(),
+            window_minutes=config.scheduler_window_minutes(),
+            max_workers=config.scheduler_workers(),
+            cluster_threshold=config.cluster_threshold()
+        )
+        if config.planner_enabled():
+            # 按推送时间倒推提前生成报告，推送时间到达时只发送发件箱中已就绪的报告
+            outbox = DigestOutbox(scheduler.search_request.db)
+            planner = PushPlanner(scheduler, outbox, **config.planner_config())
+            logger.info(f"{datetime.now()} - 多用户订阅提前准备调度已启动")
+            schedule.every().minute.do(planner.run_pending)
+        else:
+            logger.info(f"{datetime.now()} - 多用户订阅调度已启动")
+            schedule.every().minute.do(scheduler.run_pending)
+    else:
+        work_time = config.work_time()['push_hour']
+        logger.info(f"{datetime.now()} - 定时任务已设置,将在每天{work_time}点运行")
+        # 设置定时任务,每天凌晨运行一次
+        schedule.every().day.at(work_time).do(scheduled_task)
     
     
     while True:
@@ -1,22 +1,46 @@
 import mysql.connector
 from mysql.connector import Error
+from contextlib import contextmanager
 import configparser
-from openai import OpenAI
 import json
-import scipdf
+import sys
+import threading
 import time
 from typing import Dict, Any
 import re
 import pytz
 from datetime import datetime, timedelta, timezone
 import random
-import requests
-from functools import lru_cache
+from context_builder import AnalysisContextBuilder
+from utils.text import estimate_tokens
 from utils.logger import Logger
-import fitz  # PyMuPDF
 from io import BytesIO
+# openai、scipdf(spaCy)、requests、fitz 在首次使用时才导入，缩短命令行与worker的启动时间
 logger = Logger.get_logger('models')
 
+BEIJING_TZ = pytz.timezone('Asia/Shanghai')
+
+
+def published_window(days=1, now=None, start=None):
+    """计算文章发布时间的检索窗口（北京时间），MySQL与向量检索两个阶段共用
+
+    Args:
+        days: 窗口天数，窗口终点为今天零点
+        now: 当前时间，默认取当前北京时间
+        start: 显式指定的窗口起点（如订阅的投递水位），提供时忽略days
+
+    Returns:
+        tuple[datetime, datetime]: [start, end) 半开区间
+    """
+    now = now or datetime.now(BEIJING_TZ)
+    end = now.astimezone(BEIJING_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+    if start is None:
+        start = end - timedelta(days=days)
+    elif start.tzinfo is None:
+        start = BEIJING_TZ.localize(start)
+    return start, end
+
+
 class LLMModel:
     """
     封装与ChatGPT模型交互的方法，主要用于将英文标题和摘要翻译成中文。
@@ -26,9 +50,20 @@ class LLMModel:
     def __init__(self, model="qwen-plus-latest"):
         self.config = Config()
         self.api_key = self.config.api_key()
-        self.client = OpenAI(api_key=self.api_key, base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+        self._client = None
+        self._client_lock = threading.Lock()
         self.model = model
 
+    @property
+    def client(self):
+        """延迟创建OpenAI客户端，首次调用模型时才导入openai"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key, base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+        return self._client
+
     def prompt(self, message, temperature=0.3, max_tokens=8192, max_retries=3, retry_delay=30):
         """发送提示到LLM并获取响应"""
         for attempt in range(max_retries):
@@ -56,6 +91,67 @@ class LLMModel:
                     raise
 
 
+# 分析提示词版本号，修改ANALYSIS_PROMPT_TEMPLATE或其输出格式时需要递增，使旧的缓存结果失效
+ANALYSIS_PROMPT_VERSION = "2"
+
+# 论文深度分析提示词模板，{content}为按token预算挑选后的正文片段
+ANALYSIS_PROMPT_TEMPLATE = """
+# 角色
+你是一位资深专业的论文评审专家，擅长以精准、专业且全面的视角分析各类论文。你能够运用丰富的专业知识和敏锐的洞察力，按照特定要求深入剖析文章内容。
+
+## 技能
+### 技能 1: 总结文章内容
+1. 仔细研读文章，一段话总结文章内容，需全面涵盖：（1）研究背景（即作者的研究意图）、（2）采用的方法或方案、（3）设计用于证明方法的实验、（4）最终得出的结论。注意DONT SOUND LIKE AI！
+
+### 技能 2: 分析相关性
+1. 深入分析文章的研究内容与用户查询请求之间的关联度，并用一句话清晰总结。
+注意：先指出相关性程度，再提供理由。内容是输出给用户的，不要输出类似"与用户提出的xxx主题契合"等说法。
+
+### 技能 3: 提炼创新点
+1. 根据文章具体内容，简略分点列出文章的创新点。
+2. 将创新点与现有工作进行对比，指出相比现有工作的改进之处。
+
+### 技能 4: 给出推荐指数
+1. 从（1）方法创新性、（2）论文写作清晰程度、（3）与用户查询的相关程度这三个维度，对论文给出1 - 5分的整体推荐阅读指数。
+2. 针对给出的推荐指数，一句话阐述打分理由。
+3. 打分需要严格、严谨、科学。打分精确到小数点后一位
+4. 注意相关性的打分理由中，不要输出类似"与用户提出的xxx主题契合"等说法。
+
+
+## 输出要求
+请以JSON格式输出分析结果，格式如下：
+{{
+    "summary": str, 使用[技能 1]总结文章内容：仔细研读文章，一段话总结文章内容，需全面涵盖：（1）研究背景（即作者的研究意图）、（2）采用的方法或方案、（3）设计用于证明方法的实验、（4）最终得出的结论。注意DONT SOUND LIKE AI！,
+    "rating": {{
+        "overall": "推荐指数分数"，综合创新性、写作质量、与用户查询的相关性给出推荐指数分数
+        "details": {{
+            "innovation": list[str], "具体打分理由： 根据[技能 3]总结创新点, 分点列出创新点及与现有工作相比的改进，需要具有一定的批判性，客观严谨",
+            "writing": "str, 具体打分理由：根据文章的写作内容与写作质量给出打分，需要具有一定批判性，客观严谨",
+            "relevance": "str, 具体的打分理由： 根据[技能 2]总结相关性",
+        }},
+        "scores": {{
+            "innovation": "具体分数",
+            "writing": "具体分数",
+            "relevance": "具体分数"
+        }}
+    }},
+}}
+
+# 用户查询请求
+{query}
+# 文章信息
+## 文章标题
+{title}
+## 文章摘要
+{summary}
+## 文章正文
+{content}
+
+#输出语言要求：
+中文
+"""
+
+
 class Article:
     """表示从arXiv获取的文章的类，包含文章的各种元数据以及分析方法"""
     def __init__(self, authors=None, categories=None, comment=None, doi=None, entry_id=None, 
@@ -76,6 +172,82 @@ class Article:
         self.CN_title = CN_title
         self.CN_summary = CN_summary
         self._parsed_content = None
+        self._parsed_sections = None
+        # 全文解析失败、分析只基于摘要时为True，此时分析结果不写入缓存
+        self.full_text_fallback = False
+        self.context_sections = []
+        # 检索阶段给出的向量相似度与LLM置信度，用于排序
+        self.vector_score = None
+        self.llm_confidence = None
+        self.keyword_score = None
+        self.brief = None
+        self.author_and_affiliation = {}
+
+    def defer_columns(self, columns, loader, tz=None):
+        """标记未从数据库选取的列：首次访问某个属性时调用loader加载它所在分组的全部列
+
+        报告列（作者、中文翻译等）与大文本列（full_text、comment、journal_ref）分属不同分组，
+        访问CN_title不会连带读取full_text；报告列也可通过Database.preload_columns为多篇文章批量加载。
+
+        Args:
+            columns: 未选取的数据库列名
+            loader: columns -> {属性名: 值}
+            tz: 时间列转换到的时区，批量加载时使用
+        """
+        groups = {}
+        for column in columns:
+            group = groups.setdefault(Database.DEFERRED_GROUPS.get(column, 'report'), {'columns': [], 'attrs': []})
+            group['columns'].append(column)
+            group['attrs'].append(Database.COLUMN_ATTRS.get(column, column))
+        for group in groups.values():
+            for attr in group['attrs']:
+                self.__dict__.pop(attr, None)
+        self._deferred = {'groups': groups, 'loader': loader, 'tz': tz}
+
+    def _deferred_group(self, name):
+        deferred = self.__dict__.get('_deferred')
+        if deferred is None:
+            return None
+        for group, spec in deferred['groups'].items():
+            if name in spec['attrs']:
+                return group
+        return None
+
+    def __getattr__(self, name):
+        # 只有常规属性查找失败时才会调用：按需加载投影时未选取的列
+        group = self._deferred_group(name)
+        if group is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        deferred = self.__dict__['_deferred']
+        self.resolve_deferred(group, deferred['loader'](deferred['groups'][group]['columns']))
+        return self.__dict__[name]
+
+    def deferred_columns(self, group):
+        """分组中尚未加载的数据库列"""
+        deferred = self.__dict__.get('_deferred')
+        spec = deferred['groups'].get(group) if deferred else None
+        return list(spec['columns']) if spec else []
+
+    def resolve_deferred(self, group, values):
+        """用已加载的值填充一个分组的属性
+
+        加载前已被赋值的属性（如翻译结果）不被数据库中的旧值覆盖
+        """
+        deferred = self.__dict__.get('_deferred')
+        if deferred is None or group not in deferred['groups']:
+            return
+        for attr in deferred['groups'][group]['attrs']:
+            self.__dict__.setdefault(attr, values.get(attr))
+        # 复制而不是原地修改，浅拷贝出的文章之间互不影响
+        groups = {name: spec for name, spec in deferred['groups'].items() if name != group}
+        if groups:
+            self.__dict__['_deferred'] = dict(deferred, groups=groups)
+        else:
+            self.__dict__.pop('_deferred', None)
+
+    def is_deferred(self, name):
+        """属性是否尚未从数据库加载（访问它会触发一次查询）"""
+        return self._deferred_group(name) is not None
 
     def gpt_CN_translate(self, model):
         print("Running LLM翻译...")
@@ -133,6 +305,7 @@ class Article:
         return self.entry_id.replace('abs', 'pdf')
     
     def get_avail_grobid_url(self):
+        import requests
         config = Config()
         grobid_urls = json.loads(config.grobid_urls())
         if len(grobid_urls) == 0: return None
@@ -146,39 +319,85 @@ class Article:
         except:
             return None
     
-    @lru_cache(maxsize=32)
-    def _parse_pdf_content(self) -> str:
-        """解析PDF全文内容，带重试机制"""
-        
+    def _parse_pdf_sections(self) -> list:
+        """解析PDF全文，返回章节列表（每项包含heading和text），带重试机制"""
+        if self._parsed_sections is not None:
+            return self._parsed_sections
+        if self.full_text:
+            # 数据库中已有（如离线回填的）全文时直接使用，不再请求GROBID
+            self._parsed_sections = self.split_full_text(self.full_text)
+            return self._parsed_sections
+        import scipdf
+
         grobid_url = self.get_avail_grobid_url()
-        if grobid_url.endswith('/'): grobid_url = grobid_url.rstrip('/')
+        if grobid_url and grobid_url.endswith('/'): grobid_url = grobid_url.rstrip('/')
+
+        max_retries = 3  # 最大重试次数
+        retry_delay = 5  # 重试间隔（秒）
+
+        for attempt in range(max_retries):
+            try:
+                article_dict = scipdf.parse_pdf_to_dict(self.pdf_url, as_list=False, grobid_url=grobid_url)
+                self._parsed_sections = [
+                    {"heading": section['heading'], "text": section['text']}
+                    for section in article_dict['sections']
+                ]
+                return self._parsed_sections
 
+            except Exception as e:
+                if attempt < max_retries - 1:  # 如果不是最后一次尝试
+                    print(f"PDF解析失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+                    time.sleep(retry_delay)  # 等待一段时间后重试
+                else:
+                    print(f"PDF解析最终失败: {e}")
+                    print("GROBID服务不可用，请修改config中的grobid urls配置，或本地部署GROBID服务")
+
+        # 解析失败时使用摘要作为备用内容
+        self.full_text_fallback = True
+        self._parsed_sections = [{"heading": "Abstract", "text": self.summary}]
+        return self._parsed_sections
+
+    def _parse_pdf_content(self) -> str:
+        """解析PDF全文内容，返回拼接后的全部章节"""
         if self._parsed_content is None:
-            max_retries = 3  # 最大重试次数
-            retry_delay = 5  # 重试间隔（秒）
-            
-            for attempt in range(max_retries):
-                try:
-                    article_dict = scipdf.parse_pdf_to_dict(self.pdf_url, as_list=False, grobid_url=grobid_url)
-                    self._parsed_content = '\n\n'.join(
-                        f"## {section['heading']}\n{section['text']}"
-                        for section in article_dict['sections']
-                    )
-                    return self._parsed_content
-                    
-                except Exception as e:
-                    if attempt < max_retries - 1:  # 如果不是最后一次尝试
-                        print(f"PDF解析失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                        time.sleep(retry_delay)  # 等待一段时间后重试
-                    else:
-                        print(f"PDF解析最终失败: {e}")
-                        print("GROBID服务不可用，请修改config中的grobid urls配置，或本地部署GROBID服务")
-                        # 解析失败时返回摘要作为备用内容
-                        self._parsed_content = self.summary
-                        
-            return self._parsed_content
+            self._parsed_content = self.format_sections(self._parse_pdf_sections())
         return self._parsed_content
 
+    @staticmethod
+    def format_sections(sections) -> str:
+        """将章节列表拼接为full_text的存储格式（每节以"## 标题"开头）"""
+        return '\n\n'.join(
+            f"## {section['heading']}\n{section['text']}"
+            for section in sections
+        )
+
+    @staticmethod
+    def split_full_text(full_text: str) -> list:
+        """format_sections的逆操作，将full_text还原为章节列表"""
+        sections = []
+        for block in re.split(r'(?:^|\n\n)## ', full_text):
+            if not block.strip():
+                continue
+            heading, _, text = block.partition('\n')
+            sections.append({"heading": heading.strip(), "text": text.strip()})
+        return sections
+
+    def build_analysis_context(self, query: str, reserved_tokens: int = 0) -> str:
+        """按token预算挑选与查询最相关的正文片段，并记录使用了哪些章节"""
+        config = Config()
+        builder = AnalysisContextBuilder(
+            token_budget=config.context_token_budget(),
+            chunk_tokens=config.context_chunk_tokens()
+        )
+        context, self.context_sections = builder.build(
+            self._parse_pdf_sections(), query, reserved_tokens=reserved_tokens
+        )
+        logger.info(
+            f"分析上下文使用了 {len(self.context_sections)} 个章节: "
+            f"{[section['heading'] for section in self.context_sections]}"
+        )
+        return context
+
     def generate_analysis(self, query: str, model: LLMModel) -> dict:
         """生成文章分析内容"""
         llm_result = self.LLM_analysis(query, model)
@@ -213,61 +432,15 @@ class Article:
     
     def LLM_analysis(self, query: str, model: LLMModel) -> str:
         """使用LLM进行分析"""
-        prompt = f"""
-# 角色
-你是一位资深专业的论文评审专家，擅长以精准、专业且全面的视角分析各类论文。你能够运用丰富的专业知识和敏锐的洞察力，按照特定要求深入剖析文章内容。
-
-## 技能
-### 技能 1: 总结文章内容
-1. 仔细研读文章，一段话总结文章内容，需全面涵盖：（1）研究背景（即作者的研究意图）、（2）采用的方法或方案、（3）设计用于证明方法的实验、（4）最终得出的结论。注意DONT SOUND LIKE AI！
-
-### 技能 2: 分析相关性
-1. 深入分析文章的研究内容与用户查询请求之间的关联度，并用一句话清晰总结。
-注意：先指出相关性程度，再提供理由。内容是输出给用户的，不要输出类似"与用户提出的xxx主题契合"等说法。
-
-### 技能 3: 提炼创新点
-1. 根据文章具体内容，简略分点列出文章的创新点。
-2. 将创新点与现有工作进行对比，指出相比现有工作的改进之处。
-
-### 技能 4: 给出推荐指数
-1. 从（1）方法创新性、（2）论文写作清晰程度、（3）与用户查询的相关程度这三个维度，对论文给出1 - 5分的整体推荐阅读指数。
-2. 针对给出的推荐指数，一句话阐述打分理由。
-3. 打分需要严格、严谨、科学。打分精确到小数点后一位
-4. 注意相关性的打分理由中，不要输出类似"与用户提出的xxx主题契合"等说法。
-
-
-## 输出要求
-请以JSON格式输出分析结果，格式如下：
-{{
-    "summary": str, 使用[技能 1]总结文章内容：仔细研读文章，一段话总结文章内容，需全面涵盖：（1）研究背景（即作者的研究意图）、（2）采用的方法或方案、（3）设计用于证明方法的实验、（4）最终得出的结论。注意DONT SOUND LIKE AI！,
-    "rating": {{
-        "overall": "推荐指数分数"，综合创新性、写作质量、与用户查询的相关性给出推荐指数分数
-        "details": {{
-            "innovation": list[str], "具体打分理由： 根据[技能 3]总结创新点, 分点列出创新点及与现有工作相比的改进，需要具有一定的批判性，客观严谨",
-            "writing": "str, 具体打分理由：根据文章的写作内容与写作质量给出打分，需要具有一定批判性，客观严谨",
-            "relevance": "str, 具体的打分理由： 根据[技能 2]总结相关性",
-        }},
-        "scores": {{
-            "innovation": "具体分数",
-            "writing": "具体分数",
-            "relevance": "具体分数"
-        }}
-    }},
-}}
-
-# 用户查询请求
-{query}
-# 文章信息
-## 文章标题
-{self.title}
-## 文章摘要
-{self.summary}
-## 文章正文
-{self._parse_pdf_content()}
-
-#输出语言要求：
-中文
-"""     
+        reserved_tokens = estimate_tokens(ANALYSIS_PROMPT_TEMPLATE) + estimate_tokens(
+            f"{query} {self.title} {self.summary}"
+        )
+        prompt = ANALYSIS_PROMPT_TEMPLATE.format(
+            query=query,
+            title=self.title,
+            summary=self.summary,
+            content=self.build_analysis_context(query, reserved_tokens=reserved_tokens)
+        )
         response = self._safe_model_call(prompt, model)
         # print(response)
 
@@ -310,7 +483,29 @@ class Article:
                 print(f"模型调用失败: {e}")
         return "分析生成失败，请稍后再试"
 
+    def generate_brief(self, query: str, model: LLMModel) -> str:
+        """仅根据摘要生成简短的中文推荐语，用于超出深度分析预算的文章"""
+        prompt = f"""
+请根据以下论文的标题和摘要，用一到两句中文概括论文的核心内容，并说明它与用户关注主题的关系。
+只输出概括内容，不要做任何多余回答。
+
+# 用户关注主题
+{query}
+# 文章标题
+{self.title}
+# 文章摘要
+{self.summary}
+"""
+        try:
+            self.brief = model.prompt(prompt, temperature=0.3, max_tokens=300)
+        except Exception as e:
+            logger.error(f"生成简要概括失败: {e}")
+            self.brief = self.CN_summary or self.summary
+        return self.brief
+
     def get_author_and_affiliation(self, model: LLMModel):
+        import requests
+        import fitz  # PyMuPDF
         pdf_url = self.entry_id.replace('abs', 'pdf')
 
         def extract_pdf_first_page(pdf_url):
@@ -384,6 +579,79 @@ class Article:
 
 
 
+class ArticleRecord:
+    """批量场景使用的紧凑文章记录
+
+    只保存过滤阶段需要的字段与排序分数，使用__slots__而不是实例__dict__；
+    类别字符串经sys.intern驻留，成千上万篇文章共享同一份类别字符串。
+    调度器的当日快照与历史扫描持有ArticleRecord，入选的文章再通过to_article
+    转换为完整的Article（其余列按需从数据库加载）。
+    """
+    __slots__ = ('entry_id', 'title', 'summary', 'categories', 'primary_category', 'published',
+                 'vector_score', 'llm_confidence')
+    # 与Database.PROJECTIONS['filter']一致
+    COLUMNS = ('entry_id', 'title', 'summary', 'categories', 'primary_category', 'published')
+
+    def __init__(self, entry_id="", title="", summary="", categories=(), primary_category="",
+                 published=None, vector_score=None, llm_confidence=None):
+        if isinstance(categories, str):
+            categories = categories.split()
+        self.entry_id = entry_id or ""
+        self.title = title or ""
+        self.summary = summary or ""
+        self.categories = tuple(sys.intern(category) for category in categories or ())
+        self.primary_category = sys.intern(primary_category or "")
+        self.published = published
+        self.vector_score = vector_score
+        self.llm_confidence = llm_confidence
+
+    def __repr__(self):
+        return f"ArticleRecord(entry_id={self.entry_id!r}, title={self.title!r})"
+
+    @classmethod
+    def from_row(cls, row, tz=None):
+        """由arxiv_daily的一行（至少包含filter投影的列）构造记录"""
+        return cls(**{
+            column: Database._column_value(column, row.get(column), tz) for column in cls.COLUMNS
+        })
+
+    @classmethod
+    def from_article(cls, article):
+        """由Article构造记录，保留其向量分与LLM置信度"""
+        return cls(
+            entry_id=article.entry_id,
+            title=article.title,
+            summary=article.summary,
+            categories=article.categories,
+            primary_category=article.primary_category,
+            published=article.published or None,
+            vector_score=article.vector_score,
+            llm_confidence=article.llm_confidence,
+        )
+
+    def to_article(self, loader=None, tz=None):
+        """转换为Article；每次调用返回新对象，各订阅写入的排序字段互不干扰
+
+        Args:
+            loader: Database.load_columns形式的加载函数，提供时记录未包含的列在首次访问时按需加载
+            tz: 传给loader，按需加载的时间列转换到该时区
+        """
+        article = Article(
+            entry_id=self.entry_id,
+            title=self.title,
+            summary=self.summary,
+            categories=list(self.categories),
+            primary_category=self.primary_category,
+            published=self.published,
+        )
+        article.vector_score = self.vector_score
+        article.llm_confidence = self.llm_confidence
+        if loader is not None:
+            missing = [column for column in Database.PROJECTIONS['full'] if column not in self.COLUMNS]
+            article.defer_columns(missing, lambda columns: loader(article.entry_id, columns, tz), tz=tz)
+        return article
+
+
 class Config:
     """
     管理配置文件（config.ini）的类，用于读取数据库配置和API密钥。
@@ -401,6 +669,16 @@ class Config:
     def email_config(self):
         return self.config['email']
 
+    def mail_queue_config(self):
+        return {
+            'starttls': self.config.getboolean('email', 'starttls', fallback=True),
+            'use_ssl': self.config.getboolean('email', 'use_ssl', fallback=False),
+            'pool_size': int(self.config.get('email', 'pool_size', fallback='2')),
+            'spool_dir': self.config.get('email', 'spool_dir', fallback='./mail_spool'),
+            'max_retries': int(self.config.get('email', 'max_retries', fallback='5')),
+            'retry_backoff': float(self.config.get('email', 'retry_backoff_seconds', fallback='30')),
+        }
+
     def api_key(self):
         return self.config['aliyun']['api_key']
     
@@ -414,6 +692,12 @@ class Config:
     
     def max_results(self):
         return int(self.config.get('settings', 'max_results', fallback='500'))
+
+    def window_days(self):
+        return int(self.config.get('window', 'days', fallback='1'))
+
+    def max_catchup_days(self):
+        return int(self.config.get('window', 'max_catchup_days', fallback='7'))
     
     def articles_table(self):
         return self.config['settings'].get('arxiv_table')
@@ -423,192 +707,524 @@ class Config:
 
     def categories(self):
         return [category.strip() for category in self.config['settings'].get('categories').split(',')]
+
+    def context_token_budget(self):
+        return int(self.config.get('analysis', 'context_token_budget', fallback='12000'))
+
+    def context_chunk_tokens(self):
+        return int(self.config.get('analysis', 'chunk_tokens', fallback='600'))
+
+    def digest_mode(self):
+        return self.config.getboolean('report', 'digest_mode', fallback=True)
+
+    def per_article_reports(self):
+        return self.config.getboolean('report', 'per_article_pdf', fallback=False)
+
+    def render_workers(self):
+        return int(self.config.get('report', 'render_workers', fallback='4'))
+
+    def render_timeout(self):
+        return int(self.config.get('report', 'render_timeout', fallback='180'))
+
+    def template_cache_dir(self):
+        return self.config.get('report', 'template_cache_dir', fallback='./.jinja_cache')
+
+    def pipeline_io_workers(self):
+        return int(self.config.get('pipeline', 'io_workers', fallback='4'))
+
+    def pipeline_llm_workers(self):
+        return int(self.config.get('pipeline', 'llm_workers', fallback='2'))
+
+    def ranking_config(self):
+        return {
+            'max_articles': int(self.config.get('ranking', 'max_articles', fallback='10')),
+            'max_tokens': int(self.config.get('ranking', 'max_tokens', fallback='0')),
+            'weight_vector': float(self.config.get('ranking', 'weight_vector', fallback='0.4')),
+            'weight_llm': float(self.config.get('ranking', 'weight_llm', fallback='0.4')),
+            'weight_recency': float(self.config.get('ranking', 'weight_recency', fallback='0.2')),
+            'recency_half_life_hours': float(self.config.get('ranking', 'recency_half_life_hours', fallback='48')),
+        }
+
+    def multi_tenant_enabled(self):
+        return self.config.getboolean('scheduler', 'multi_tenant', fallback=False)
+
+    def scheduler_window_minutes(self):
+        return int(self.config.get('scheduler', 'window_minutes', fallback='60'))
+
+    def scheduler_workers(self):
+        return int(self.config.get('scheduler', 'workers', fallback='4'))
+
+    def cluster_threshold(self):
+        return float(self.config.get('scheduler', 'cluster_threshold', fallback='0.9'))
+
+    def planner_enabled(self):
+        return self.config.getboolean('planner', 'enabled', fallback=False)
+
+    def planner_config(self):
+        return {
+            'ingest_lag_minutes': int(self.config.get('planner', 'ingest_lag_minutes', fallback='90')),
+            'estimated_minutes': int(self.config.get('planner', 'estimated_minutes', fallback='30')),
+            'safety_margin_minutes': int(self.config.get('planner', 'safety_margin_minutes', fallback='15')),
+            'max_late_minutes': int(self.config.get('planner', 'max_late_minutes', fallback='180')),
+        }
+
+    def keyword_backend(self):
+        """关键词阶段的实现：fulltext使用MySQL的ngram FULLTEXT索引，bm25为进程内BM25索引，substring为内存中的子串匹配"""
+        return self.config.get('keyword', 'backend', fallback='fulltext')
+
+    def bm25_include_cn(self):
+        return self.config.getboolean('keyword', 'bm25_include_cn', fallback=False)
+
+    def keyword_title_weight(self):
+        return float(self.config.get('keyword', 'title_weight', fallback='2'))
+
+    def retrieval_config(self):
+        """候选召回方式：vector为向量检索，hybrid为关键词与向量并行检索后做RRF融合"""
+        return {
+            'mode': self.config.get('retrieval', 'mode', fallback='vector'),
+            'top_n': int(self.config.get('retrieval', 'top_n', fallback='30')),
+            'rrf_k': int(self.config.get('retrieval', 'rrf_k', fallback='60')),
+            'vector_scoring': self.config.get('retrieval', 'vector_scoring', fallback='search'),
+        }
+
+    def snapshot_enabled(self):
+        return self.config.getboolean('snapshot', 'enabled', fallback=True)
+
+    def snapshot_refresh_seconds(self):
+        return int(self.config.get('snapshot', 'refresh_seconds', fallback='300'))
+
+    def analysis_cache_config(self):
+        return {
+            'cache_dir': self.config.get('cache', 'dir', fallback='./analysis_cache'),
+            'ttl_seconds': int(float(self.config.get('cache', 'ttl_hours', fallback='168')) * 3600),
+            'max_bytes': int(float(self.config.get('cache', 'max_mb', fallback='2048')) * 1024 ** 2),
+        }
     
 
 class Database:
     """
     数据库操作类，用于管理与MySQL数据库的连接和操作。
     包括检查文章是否已存在于数据库中以及插入新文章。
+
+    连接来自按数据库配置共享的连接池：同一进程内所有模块的Database实例复用同一个池，
+    取出连接时做健康检查（断线自动重连），cursor()上下文负责提交/回滚与归还连接。
     """
-    def __init__(self, db_config):
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, db_config, pool_size=None, checkout_timeout=None):
+        db_config = dict(db_config)
+        # 连接池参数不属于mysql.connector.connect的连接参数
+        configured_size = db_config.pop('pool_size', 5)
+        configured_timeout = db_config.pop('pool_timeout', 30)
+        self.pool_size = int(pool_size or configured_size)
+        self.checkout_timeout = float(checkout_timeout or configured_timeout)
         self.db_config = db_config
 
+    def _pool(self):
+        """获取（必要时创建）与当前配置对应的共享连接池"""
+        key = tuple(sorted((k, str(v)) for k, v in self.db_config.items()))
+        pool = Database._pools.get(key)
+        if pool is None:
+            with Database._pools_lock:
+                pool = Database._pools.get(key)
+                if pool is None:
+                    from mysql.connector import pooling
+                    pool = pooling.MySQLConnectionPool(
+                        pool_name=f"arxiv_pool_{len(Database._pools)}",
+                        pool_size=self.pool_size,
+                        pool_reset_session=True,
+                        **self.db_config
+                    )
+                    Database._pools[key] = pool
+        return pool
+
     def get_connection(self):
-        return mysql.connector.connect(**self.db_config)
+        """从连接池取出一个可用连接，调用方用完后close()即归还到池中
+
+        池已耗尽时在checkout_timeout内等待其他线程归还连接。
+        """
+        from mysql.connector.errors import PoolError
+        deadline = time.monotonic() + self.checkout_timeout
+        delay = 0.05
+        while True:
+            try:
+                conn = self._pool().get_connection()
+                break
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+        try:
+            # 健康检查：连接被服务端断开（wait_timeout等）时自动重连
+            conn.ping(reconnect=True, attempts=3, delay=1)
+        except Error:
+            conn.close()
+            raise
+        return conn
+
+    @contextmanager
+    def cursor(self, dictionary=False, commit=False):
+        """取出连接并返回游标，退出时关闭游标并归还连接
+
+        Args:
+            dictionary: 是否返回字典形式的行
+            commit: 正常退出时提交事务，异常时回滚
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+        except Exception:
+            if commit:
+                conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
     
     def article_exists(self, entry_id, table_name):
         query = f"SELECT COUNT(1) FROM {table_name} WHERE entry_id = %s"
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        with self.cursor() as cursor:
             cursor.execute(query, (entry_id,))
             result = cursor.fetchone()
             return result[0] > 0
+
+    # 列投影：filter只取过滤阶段需要的列；report另加生成报告所需的列；full为全部列。
+    # 未选取的列在首次访问时按需从数据库加载（见Article.defer_columns）
+    PROJECTIONS = {
+        'filter': ('entry_id', 'title', 'summary', 'categories', 'primary_category', 'published'),
+        'report': ('entry_id', 'title', 'summary', 'categories', 'primary_category', 'published',
+                   'authors', 'updated', 'CN_title', 'CN_summary', 'author_affiliations'),
+        'full': ('entry_id', 'title', 'summary', 'categories', 'primary_category', 'published',
+                 'authors', 'updated', 'CN_title', 'CN_summary', 'author_affiliations',
+                 'doi', 'journal_ref', 'comment', 'full_text'),
+    }
+    # 列名与Article属性名不同的列
+    COLUMN_ATTRS = {'author_affiliations': 'author_and_affiliation'}
+    # 按需加载的分组：大文本列单独加载，其余未选取的列属于report分组
+    DEFERRED_GROUPS = {'full_text': 'large', 'comment': 'large', 'journal_ref': 'large'}
+    PRELOAD_CHUNK = 500
+
+    @classmethod
+    def projection_sql(cls, profile):
+        if profile not in cls.PROJECTIONS:
+            raise ValueError(f"未知的投影配置: {profile}，可选: {', '.join(cls.PROJECTIONS)}")
+        return ", ".join(cls.PROJECTIONS[profile])
+
+    @staticmethod
+    def _column_value(column, value, tz=None):
+        """将一列的数据库值转换为Article属性值"""
+        # 将JSON字符串转换为Python对象
+        if column in ('authors', 'categories'):
+            return json.loads(value) if value else []
+        if column == 'author_affiliations':
+            return (json.loads(value) if value else None) or {}
+        if column in ('published', 'updated'):
+            return value.astimezone(tz) if (value and tz is not None) else value
+        if column in ('CN_title', 'CN_summary', 'full_text'):
+            return value
+        return value or ""
+
+    @classmethod
+    def _article_from_row(cls, row, tz=None, loader=None):
+        """将arxiv_daily的一行转换为Article
+
+        Args:
+            tz: 提供时把发布/更新时间转换到该时区
+            loader: 提供时，投影中未选取的列在首次访问时通过loader按需加载
+        """
+        article = Article()
+        for column, value in row.items():
+            setattr(article, cls.COLUMN_ATTRS.get(column, column), cls._column_value(column, value, tz))
+        if loader is not None:
+            missing = [column for column in cls.PROJECTIONS['full'] if column not in row]
+            if missing:
+                article.defer_columns(missing, lambda columns: loader(article.entry_id, columns, tz), tz=tz)
+        return article
+
+    def load_columns(self, entry_id, columns, tz=None):
+        """加载单篇文章的指定列，返回 {Article属性名: 值}"""
+        unknown = set(columns) - set(self.PROJECTIONS['full'])
+        if unknown:
+            raise ValueError(f"未知的列: {unknown}")
+        query = f"SELECT {', '.join(columns)} FROM arxiv_daily WHERE entry_id = %s"
+        with self.cursor(dictionary=True) as cursor:
+            cursor.execute(query, (entry_id,))
+            row = cursor.fetchone() or {}
+        return {
+            self.COLUMN_ATTRS.get(column, column): self._column_value(column, row.get(column), tz)
+            for column in columns
+        }
+
+    def preload_columns(self, articles, group='report'):
+        """为多篇文章批量加载一个按需加载分组，每PRELOAD_CHUNK篇只查询一次
+
+        用于排序选出的文章在生成报告前一次性取回作者、中文翻译等列，避免逐篇往返
+        """
+        pending = [
+            article for article in articles
+            if getattr(article, 'deferred_columns', None) and article.deferred_columns(group)
+        ]
+        for i in range(0, len(pending), self.PRELOAD_CHUNK):
+            chunk = pending[i:i + self.PRELOAD_CHUNK]
+            columns = sorted({column for article in chunk for column in article.deferred_columns(group)})
+            placeholders = ", ".join(["%s"] * len(chunk))
+            query = f"SELECT entry_id, {', '.join(columns)} FROM arxiv_daily WHERE entry_id IN ({placeholders})"
+            try:
+                with self.cursor(dictionary=True) as cursor:
+                    cursor.execute(query, tuple(article.entry_id for article in chunk))
+                    rows = {row['entry_id']: row for row in cursor.fetchall()}
+            except Error as e:
+                # 失败时保持按需加载，访问时再逐篇查询
+                print(f"批量加载文章列时出错: {e}")
+                continue
+            for article in chunk:
+                row = rows.get(article.entry_id, {})
+                tz = article._deferred.get('tz')
+                article.resolve_deferred(group, {
+                    self.COLUMN_ATTRS.get(column, column): self._column_value(column, row.get(column), tz)
+                    for column in article.deferred_columns(group)
+                })
+
+    @classmethod
+    def articles_query(cls, category, limit, window, profile='full'):
+        """构造按类别与发布时间窗口获取文章的SQL，同步与异步数据库层共用，limit为None时不限数量"""
+        columns = cls.projection_sql(profile)
+        # 获取北京时间的时间范围
+        yesterday_start, today_start = window or published_window(1)
+        logger.info(f"today_start: {today_start}, yesterday_start: {yesterday_start}")
+
+        query = f"""
+            SELECT {columns}
+            FROM arxiv_daily
+            WHERE published >= %s
+            AND published < %s
+            """
+        params = (yesterday_start, today_start)
+        if category:
+            # 使用JSON_CONTAINS检查categories数组，category需转换为JSON字符串
+            query += "AND JSON_CONTAINS(categories, %s)\n"
+            params += (json.dumps(category),)
+        query += "ORDER BY published DESC\n"
+        if limit:
+            query += "LIMIT %s\n"
+            params += (limit,)
+        return query, params
+
+    @classmethod
+    def articles_query_without_time(cls, category, limit, profile='full'):
+        """构造按主分类获取最新文章（不限时间）的SQL，limit为None时不限数量"""
+        columns = cls.projection_sql(profile)
+        query = f"""
+            SELECT {columns}
+            FROM arxiv_daily
+            """
+        params = ()
+        if category:
+            query += "WHERE primary_category = %s\n"
+            # 直接使用category字符串，不需要json.dumps
+            params += (category,)
+        query += "ORDER BY published DESC\n"
+        if limit:
+            query += "LIMIT %s\n"
+            params += (limit,)
+        return query, params
     
-    def fetch_articles_from_db(self, category, limit=100):
+    def fetch_articles_from_db(self, category, limit=100, window=None, profile='report'):
         """从数据库获取文章数据
         
         Args:
             category (str, optional): 文章类别. 默认为None表示获取所有类别
             limit (int, optional): 最大获取数量. 默认100
+            window (tuple, optional): 发布时间窗口 (start, end)，默认为昨天全天（北京时间）
+            profile (str, optional): 列投影，filter/report/full，未选取的列在首次访问时加载
             
         Returns:
             list[Article]: 文章对象列表
         """
+        query, params = self.articles_query(category, limit, window, profile)
         try:
-        
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor(dictionary=True)
-            
-            # 获取北京时间的时间范围
-            beijing_tz = pytz.timezone('Asia/Shanghai')
-            now = datetime.now(beijing_tz)
-            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            yesterday_start = today_start - timedelta(days=1)
-            
-            logger.info(f"today_start: {today_start}, yesterday_start: {yesterday_start}")
-            
-            if category:
-                query = """
-                SELECT entry_id, title, summary, authors, categories, 
-                    primary_category, published, updated, doi, 
-                    journal_ref, comment, full_text,
-                    CN_title, CN_summary
-                FROM arxiv_daily
-                WHERE JSON_CONTAINS(categories, %s)  -- 使用JSON_CONTAINS检查categories数组
-                AND published >= %s
-                AND published < %s
-                ORDER BY published DESC
-                LIMIT %s
-                """
-                cursor.execute(query, (
-                    json.dumps(category),  # 将category转换为JSON字符串
-                    yesterday_start,
-                    today_start,
-                    limit
-                ))
-            else:
-                query = """
-                SELECT entry_id, title, summary, authors, categories, 
-                    primary_category, published, updated, doi, 
-                    journal_ref, comment, full_text,
-                    CN_title, CN_summary
-                FROM arxiv_daily
-                WHERE published >= %s
-                AND published < %s
-                ORDER BY published DESC
-                LIMIT %s
-                """
-                cursor.execute(query, (
-                    yesterday_start,
-                    today_start,
-                    limit
-                ))
-                
-            rows = cursor.fetchall()
-            
-            articles = []
-            for row in rows:
-                # 将JSON字符串转换为Python对象
-                authors = json.loads(row['authors']) if row['authors'] else []
-                categories = json.loads(row['categories']) if row['categories'] else []
-               
-                
-                # 将UTC时间转换回北京时间
-                published = row['published'].astimezone(beijing_tz) if row['published'] else None
-                updated = row['updated'].astimezone(beijing_tz) if row['updated'] else None
-                
-                article = Article(
-                    authors=authors,
-                    categories=categories,
-                    comment=row['comment'],
-                    doi=row['doi'],
-                    entry_id=row['entry_id'],
-                    journal_ref=row['journal_ref'],
-                    primary_category=row['primary_category'],
-                    published=published,
-                    summary=row['summary'],
-                    title=row['title'],
-                    updated=updated,
-                    CN_title=row['CN_title'],
-                    CN_summary=row['CN_summary'],
-                    full_text=row['full_text']
-                )
-                articles.append(article)
-                
-            return articles
-            
+            with self.cursor(dictionary=True) as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
         except Error as e:
             print(f"数据库错误: {e}")
             return []
-        finally:
-            if conn.is_connected():
-                cursor.close()  
-                conn.close()
+
+        # 将UTC时间转换回北京时间
+        return [self._article_from_row(row, tz=BEIJING_TZ, loader=self.load_columns) for row in rows]
     
-    def fetch_articles_from_db_without_time(self, category, limit=100):
+    def fetch_articles_from_db_without_time(self, category, limit=100, profile='report'):
         """从数据库获取文章数据
         
         Args:
             category (str): 文章主分类
             limit (int, optional): 最大获取数量. 默认10
+            profile (str, optional): 列投影，filter/report/full
             
         Returns:
             list[Article]: 文章对象列表
         """
-        conn = mysql.connector.connect(**self.db_config)
-        cursor = conn.cursor(dictionary=True)
-        
-        if category:
-            query = """
-            SELECT entry_id, title, summary, authors, categories, 
-                primary_category, published, updated, doi, 
-                journal_ref, comment, full_text,
-                CN_title, CN_summary
-            FROM arxiv_daily
-            WHERE primary_category = %s
-            ORDER BY published DESC
-            LIMIT %s
-            """
-            cursor.execute(query, (
-                category,  # 直接使用category字符串，不需要json.dumps
-                limit
-            ))
-        else:
-            query = """
-            SELECT entry_id, title, summary, authors, categories, 
-                primary_category, published, updated, doi, 
-                journal_ref, comment, full_text,
-                CN_title, CN_summary
+        query, params = self.articles_query_without_time(category, limit, profile)
+        with self.cursor(dictionary=True) as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+        return [self._article_from_row(row, loader=self.load_columns) for row in rows]
+
+    def stream_rows(self, query, params=None, fetch_size=500):
+        """用无缓冲游标执行查询，逐批产出行（list[dict]）
+
+        结果集留在服务端按需读取，客户端同时只持有fetch_size行。
+        迭代提前结束时丢弃剩余结果，连接才能归还到连接池。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            try:
+                conn.consume_results()
+            except Error:
+                pass
+            cursor.close()
+            conn.close()
+
+    # 与README中的ngram FULLTEXT索引一一对应：MATCH的列必须与索引的列完全一致
+    FULLTEXT_INDEXES = (('title',), ('summary',), ('CN_title', 'CN_summary'))
+    # 布尔模式中有特殊含义的字符
+    FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+    @classmethod
+    def fulltext_expression(cls, keywords):
+        """将关键词转换为布尔模式的检索式：每个关键词作为一个短语，任一命中即匹配"""
+        phrases = []
+        for keyword in keywords or []:
+            keyword = " ".join(cls.FULLTEXT_OPERATORS.sub(" ", str(keyword)).split())
+            if keyword:
+                phrases.append(f'"{keyword}"')
+        return " ".join(phrases)
+
+    @classmethod
+    def fulltext_query(cls, keywords, category, limit, window, profile='filter', title_weight=2.0):
+        """构造关键词全文检索的SQL：MATCH ... AGAINST与时间窗口、类别条件一起下推到MySQL
+
+        标题、摘要与中文标题摘要分别使用各自的FULLTEXT索引，相关度为三者之和（标题乘以title_weight），
+        结果按相关度降序。没有可用关键词时返回 (None, None)。
+
+        Returns:
+            tuple: (query, params)，行中额外包含keyword_score列
+        """
+        expression = cls.fulltext_expression(keywords)
+        if not expression:
+            return None, None
+        columns = cls.projection_sql(profile)
+        matches = [f"MATCH({', '.join(index)}) AGAINST (%s IN BOOLEAN MODE)" for index in cls.FULLTEXT_INDEXES]
+        start, end = window or published_window(1)
+
+        query = f"""
+            SELECT {columns},
+                   {matches[0]} * %s + {matches[1]} + {matches[2]} AS keyword_score
             FROM arxiv_daily
-            ORDER BY published DESC
-            LIMIT %s
+            WHERE ({" OR ".join(matches)})
+            AND published >= %s
+            AND published < %s
             """
-            cursor.execute(query, (limit,))
-            
-        rows = cursor.fetchall()
-        
+        params = (expression, title_weight, expression, expression) + (expression,) * len(matches) + (start, end)
+        if category:
+            query += "AND JSON_CONTAINS(categories, %s)\n"
+            params += (json.dumps(category),)
+        query += "ORDER BY keyword_score DESC\n"
+        if limit:
+            query += "LIMIT %s\n"
+            params += (limit,)
+        return query, params
+
+    def fulltext_search(self, keywords, category, limit=100, window=None, profile='filter', title_weight=2.0):
+        """用FULLTEXT索引检索窗口内命中关键词的文章，只有命中的行从数据库返回
+
+        Returns:
+            list[Article]: 按相关度降序，keyword_score为MySQL给出的相关度
+        """
+        query, params = self.fulltext_query(keywords, category, limit, window, profile, title_weight)
+        if query is None:
+            return []
+        try:
+            with self.cursor(dictionary=True) as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+        except Error as e:
+            print(f"全文检索出错: {e}")
+            return []
+
         articles = []
         for row in rows:
-            # 将JSON字符串转换为Python对象
-            authors = json.loads(row['authors']) if row['authors'] else []
-            categories = json.loads(row['categories']) if row['categories'] else []
-            
-            article = Article(
-                authors=authors,
-                categories=categories,
-                comment=row['comment'],
-                doi=row['doi'],
-                entry_id=row['entry_id'],
-                journal_ref=row['journal_ref'],
-                primary_category=row['primary_category'],
-                published=row['published'],
-                summary=row['summary'],
-                title=row['title'],
-                updated=row['updated'],
-                CN_title=row['CN_title'],
-                CN_summary=row['CN_summary'],
-                full_text=row['full_text']
-            )
+            score = row.pop('keyword_score')
+            article = self._article_from_row(row, tz=BEIJING_TZ, loader=self.load_columns)
+            article.keyword_score = float(score or 0)
             articles.append(article)
-            
         return articles
+
+    def fetch_records_from_db(self, category, limit=100, window=None):
+        """fetch_articles_from_db的紧凑版本：只取过滤所需的列，返回list[ArticleRecord]"""
+        query, params = self.articles_query(category, limit, window, 'filter')
+        try:
+            with self.cursor(dictionary=True) as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+        except Error as e:
+            print(f"数据库错误: {e}")
+            return []
+        return [ArticleRecord.from_row(row, tz=BEIJING_TZ) for row in rows]
+
+    def _iter_articles(self, query, params, tz, fetch_size, batch_size, records=False):
+        batch = []
+        for rows in self.stream_rows(query, params, fetch_size):
+            for row in rows:
+                if records:
+                    article = ArticleRecord.from_row(row, tz=tz)
+                else:
+                    article = self._article_from_row(row, tz=tz, loader=self.load_columns)
+                if not batch_size:
+                    yield article
+                    continue
+                batch.append(article)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def iter_articles_from_db(self, category, limit=None, window=None, fetch_size=500, batch_size=None,
+                              profile='report', records=False):
+        """fetch_articles_from_db的流式版本：逐篇（或按batch_size逐批）产出文章，内存占用与limit无关"""
+        if records:
+            profile = 'filter'
+        query, params = self.articles_query(category, limit, window, profile)
+        return self._iter_articles(query, params, BEIJING_TZ, fetch_size, batch_size, records)
+
+    def iter_articles_from_db_without_time(self, category, limit=None, fetch_size=500, batch_size=None,
+                                           profile='report', records=False):
+        """fetch_articles_from_db_without_time的流式版本
+
+        Args:
+            category (str): 文章主分类，None表示所有类别
+            limit (int, optional): 最大获取数量，None表示不限
+            fetch_size (int): 每次从服务端读取的行数
+            batch_size (int, optional): 提供时按批产出list[Article]，否则逐篇产出Article
+            profile (str): 列投影
+            records (bool): 为True时产出ArticleRecord（固定使用filter投影）
+        """
+        if records:
+            profile = 'filter'
+        query, params = self.articles_query_without_time(category, limit, profile)
+        return self._iter_articles(query, params, None, fetch_size, batch_size, records)
@@ -0,0 +1,239 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+from mysql.connector import Error
+
+from models import BEIJING_TZ
+from utils.logger import Logger
+
+logger = Logger.get_logger('push_planner')
+
+ARXIV_TZ = pytz.timezone('America/New_York')
+# arXiv新论文在美东时间周日至周四20:00公布
+ARXIV_ANNOUNCE_HOUR = 20
+ARXIV_ANNOUNCE_WEEKDAYS = {6, 0, 1, 2, 3}
+
+
+def latest_announcement(before):
+    """before（含）之前最近一次arXiv公布新论文的时间（北京时间）"""
+    local = before.astimezone(ARXIV_TZ)
+    for days_back in range(8):
+        day = (local - timedelta(days=days_back)).date()
+        if day.weekday() not in ARXIV_ANNOUNCE_WEEKDAYS:
+            continue
+        announced = ARXIV_TZ.localize(datetime(day.year, day.month, day.day, ARXIV_ANNOUNCE_HOUR))
+        if announced <= local:
+            return announced.astimezone(BEIJING_TZ)
+    return None
+
+
+class DigestOutbox:
+    """提前生成的订阅报告发件箱（digest_outbox表）
+
+    每个订阅每天一行：status为ready表示报告已就绪等待推送，sent表示已推送，
+    missed表示到推送时间报告仍未就绪（之后就绪时会立即补发）。
+    missed_deadline记录报告是否晚于推送时间才就绪，用于统计错过推送的次数。
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def store(self, request, pdf_path, entry_ids, delivered_until, prepare_seconds):
+        """保存已生成的报告；pdf_path为None表示没有相关文章，推送时只推进水位"""
+        deliver_at = request['deadline'].replace(tzinfo=None)
+        finished_at = datetime.now(BEIJING_TZ).replace(tzinfo=None)
+        query = """
+        INSERT INTO digest_outbox
+        (request_id, digest_date, deliver_at, pdf_path, entry_ids, delivered_until,
+         prepare_seconds, status, missed_deadline, prepared_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, 'ready', %s, %s)
+        ON DUPLICATE KEY UPDATE
+            pdf_path = VALUES(pdf_path), entry_ids = VALUES(entry_ids),
+            delivered_until = VALUES(delivered_until), prepare_seconds = VALUES(prepare_seconds),
+            status = 'ready', prepared_at = VALUES(prepared_at),
+            missed_deadline = GREATEST(missed_deadline, VALUES(missed_deadline))
+        """
+        self._execute(query, (
+            request['request_id'], deliver_at.date(), deliver_at, pdf_path, json.dumps(entry_ids),
+            delivered_until, prepare_seconds, int(finished_at > deliver_at), finished_at
+        ))
+
+    def record_missed(self, request_id, deadline):
+        """记录推送时间已到但报告仍未就绪"""
+        deliver_at = deadline.replace(tzinfo=None)
+        query = """
+        INSERT INTO digest_outbox (request_id, digest_date, deliver_at, status, missed_deadline)
+        VALUES (%s, %s, %s, 'missed', 1)
+        ON DUPLICATE KEY UPDATE missed_deadline = 1
+        """
+        self._execute(query, (request_id, deliver_at.date(), deliver_at))
+
+    def mark_sent(self, request_id, digest_date):
+        query = """
+        UPDATE digest_outbox SET status = 'sent', sent_at = %s
+        WHERE request_id = %s AND digest_date = %s
+        """
+        self._execute(query, (datetime.now(BEIJING_TZ).replace(tzinfo=None), request_id, digest_date))
+
+    def statuses(self, digest_date):
+        """{request_id: status}，当天的报告状态"""
+        rows = self._fetch(
+            "SELECT request_id, status FROM digest_outbox WHERE digest_date = %s", (digest_date,)
+        )
+        return {row['request_id']: row['status'] for row in rows}
+
+    def due(self, now):
+        """已到推送时间且已就绪的报告"""
+        query = """
+        SELECT o.request_id, o.digest_date, o.pdf_path, o.entry_ids, o.delivered_until,
+               r.email, r.query_content
+        FROM digest_outbox o JOIN search_requests r ON o.request_id = r.request_id
+        WHERE o.status = 'ready' AND o.deliver_at <= %s
+        ORDER BY o.deliver_at
+        """
+        return self._fetch(query, (now.replace(tzinfo=None),))
+
+    def average_durations(self, days=7):
+        """{request_id: 最近days天的平均准备耗时（秒）}"""
+        query = """
+        SELECT request_id, AVG(prepare_seconds) AS seconds
+        FROM digest_outbox
+        WHERE prepare_seconds IS NOT NULL AND digest_date >= %s
+        GROUP BY request_id
+        """
+        since = (datetime.now(BEIJING_TZ) - timedelta(days=days)).date()
+        return {row['request_id']: float(row['seconds']) for row in self._fetch(query, (since,))}
+
+    def missed_count(self, since_date):
+        """since_date以来错过推送时间的次数"""
+        rows = self._fetch(
+            "SELECT COUNT(*) AS n FROM digest_outbox WHERE missed_deadline = 1 AND digest_date >= %s",
+            (since_date,)
+        )
+        return rows[0]['n'] if rows else 0
+
+    def _execute(self, query, params):
+        try:
+            with self.db.cursor(commit=True) as cursor:
+                cursor.execute(query, params)
+        except Error as e:
+            print(f"写入发件箱时出错: {e}")
+
+    def _fetch(self, query, params):
+        try:
+            with self.db.cursor(dictionary=True) as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        except Error as e:
+            print(f"读取发件箱时出错: {e}")
+            return []
+
+
+class PushPlanner:
+    """按推送时间倒排的提前准备调度
+
+    每个订阅的开始时间 = max(数据就绪时间, 推送时间 - 预计耗时 - 安全余量)，
+    数据就绪时间为最近一次arXiv公布时间加上抓取入库的延迟；预计耗时取该订阅
+    最近几天的平均准备耗时（没有历史时用配置的默认值）。重计算在后台线程中执行并
+    把报告存入发件箱，投递任务每分钟只发送已就绪且到达推送时间的报告。
+    """
+    def __init__(self, scheduler, outbox, ingest_lag_minutes=90, estimated_minutes=30,
+                 safety_margin_minutes=15, max_late_minutes=180):
+        self.scheduler = scheduler
+        self.outbox = outbox
+        self.ingest_lag = timedelta(minutes=ingest_lag_minutes)
+        self.estimated = timedelta(minutes=estimated_minutes)
+        self.safety_margin = timedelta(minutes=safety_margin_minutes)
+        self.max_late = timedelta(minutes=max_late_minutes)
+        self.missed_deadlines = 0
+        self._preparing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='push-planner')
+
+    def deadline(self, request, now):
+        """订阅今天的推送时间（北京时间）"""
+        return BEIJING_TZ.localize(datetime.combine(now.date(), request['push_time']))
+
+    def start_at(self, request, deadline, durations):
+        """订阅最晚应开始准备的时间，不早于数据就绪时间"""
+        seconds = durations.get(request['request_id'])
+        estimate = timedelta(seconds=seconds) if seconds else self.estimated
+        start = deadline - estimate - self.safety_margin
+        announced = latest_announcement(deadline)
+        if announced is not None:
+            start = max(start, announced + self.ingest_lag)
+        return start
+
+    def plan(self, now=None):
+        """挑出到达开始时间、当天尚未准备的订阅，提交到后台准备"""
+        now = now or datetime.now(BEIJING_TZ)
+        requests = self.scheduler.search_request.fetch_active_requests()
+        statuses = self.outbox.statuses(now.date())
+        durations = self.outbox.average_durations()
+
+        due = []
+        for request in requests:
+            request_id = request['request_id']
+            status = statuses.get(request_id)
+            if status in ('ready', 'sent'):
+                continue
+            deadline = self.deadline(request, now)
+            if now >= deadline and status is None:
+                self.outbox.record_missed(request_id, deadline)
+                self.missed_deadlines += 1
+                logger.warning(f"订阅 {request_id} 在推送时间 {deadline:%H:%M} 前未完成准备")
+            if now > deadline + self.max_late:
+                continue
+            with self._lock:
+                if request_id in self._preparing:
+                    continue
+            if now >= self.start_at(request, deadline, durations):
+                request['deadline'] = deadline
+                due.append(request)
+
+        if due:
+            with self._lock:
+                self._preparing.update(request['request_id'] for request in due)
+            logger.info(f"开始提前准备 {len(due)} 个订阅的报告")
+            self._executor.submit(self._prepare, due)
+        return due
+
+    def _prepare(self, requests):
+        try:
+            self.scheduler.run_batch(self.scheduler.group_by_category(requests), outbox=self.outbox)
+        except Exception as e:
+            logger.error(f"提前准备报告时出错: {e}")
+        finally:
+            with self._lock:
+                self._preparing.difference_update(request['request_id'] for request in requests)
+
+    def deliver(self, now=None):
+        """只发送发件箱中已就绪且到达推送时间的报告"""
+        now = now or datetime.now(BEIJING_TZ)
+        sent = 0
+        for row in self.outbox.due(now):
+            request_id = row['request_id']
+            entry_ids = json.loads(row['entry_ids']) if row['entry_ids'] else []
+            if row['pdf_path']:
+                if not self.scheduler.analyzer.send_report_email(row['pdf_path'], row['query_content'], row['email']):
+                    # 发送失败保持ready状态，下一分钟重试
+                    continue
+            else:
+                entry_ids = []
+            self.scheduler.search_request.mark_delivered(request_id, entry_ids, row['delivered_until'])
+            self.outbox.mark_sent(request_id, row['digest_date'])
+            sent += 1
+        if sent:
+            logger.info(f"已推送 {sent} 份报告，累计错过推送时间 {self.missed_deadlines} 次")
+        return sent
+
+    def run_pending(self, now=None):
+        """主循环每分钟调用：先投递到期的报告，再安排需要开始准备的订阅"""
+        now = now or datetime.now(BEIJING_TZ)
+        self.deliver(now)
+        self.plan(now)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,104 @@
+import threading
+from collections import defaultdict
+
+from utils.logger import Logger
+
+logger = Logger.get_logger('query_clustering')
+
+
+class QueryCluster:
+    """一组语义相近的订阅查询，以代表查询的LLM判断结果作为整组的相关性判断"""
+    def __init__(self, key, query, keywords=None):
+        self.key = key
+        self.query = query
+        self.keywords = keywords
+        self.members = []
+
+    def __repr__(self):
+        return f"QueryCluster(key={self.key!r}, query={self.query!r}, members={len(self.members)})"
+
+
+def cluster_queries(queries, embed_fn, threshold=0.9, vectors=None):
+    """按embedding余弦相似度对查询做贪心聚类
+
+    依次处理每个查询：若与已有某个簇代表的相似度不低于threshold则加入该簇，
+    否则自成一簇并作为代表。threshold越低，共享判断的订阅越多、吞吐越高，但精度越低；
+    threshold >= 1 时相当于关闭聚类。
+
+    Args:
+        queries: {请求ID: 查询文本}，按请求ID排序处理以保证结果稳定
+        embed_fn: 文本 -> 向量 的函数（如VectorDB.get_embedding，带缓存）
+        threshold: 相似度阈值
+        vectors: 预先计算的 {请求ID: 向量}，命中时不再调用embed_fn
+
+    Returns:
+        dict: {请求ID: QueryCluster}
+    """
+    import numpy as np
+
+    vectors = vectors or {}
+    assignment, clusters, centers = {}, [], []
+    for request_id in sorted(queries):
+        query = queries[request_id]
+        cluster = None
+        if threshold < 1:
+            vector = vectors.get(request_id)
+            vector = np.asarray(embed_fn(query) if vector is None else vector, dtype=np.float32)
+            vector /= (np.linalg.norm(vector) or 1.0)
+            if centers:
+                similarities = np.stack(centers) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= threshold:
+                    cluster = clusters[best]
+        else:
+            vector = None
+
+        if cluster is None:
+            # 以规范化的代表查询为键，同一天内不同窗口的相同代表查询也能复用判断
+            cluster = QueryCluster(key=" ".join(query.lower().split()), query=query)
+            clusters.append(cluster)
+            if vector is not None:
+                centers.append(vector)
+        cluster.members.append(request_id)
+        assignment[request_id] = cluster
+
+    shared = sum(len(c.members) for c in clusters if len(c.members) > 1)
+    logger.info(f"{len(queries)} 个查询聚为 {len(clusters)} 簇，其中 {shared} 个查询共享过滤结果")
+    return assignment
+
+
+class VerdictCache:
+    """LLM相关性判断缓存，键为 (簇代表, entry_id)
+
+    同一簇的过滤通过簇级锁串行执行，后到的订阅直接复用前一个订阅写入的判断。
+    """
+    def __init__(self):
+        self._verdicts = {}
+        self._lock = threading.Lock()
+        self._cluster_locks = defaultdict(threading.Lock)
+        self.hits = 0
+        self.misses = 0
+
+    def cluster_lock(self, cluster_key):
+        with self._lock:
+            return self._cluster_locks[cluster_key]
+
+    def get(self, cluster_key, entry_id):
+        """返回 (是否相关, 置信度)，未缓存时返回None"""
+        with self._lock:
+            verdict = self._verdicts.get((cluster_key, entry_id))
+            if verdict is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return verdict
+
+    def set(self, cluster_key, entry_id, relevant, confidence=None):
+        with self._lock:
+            self._verdicts[(cluster_key, entry_id)] = (relevant, confidence)
+
+    def clear(self):
+        with self._lock:
+            self._verdicts.clear()
+            self._cluster_locks.clear()
+            self.hits = self.misses = 0
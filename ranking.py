@@ -0,0 +1,102 @@
+import heapq
+import math
+from datetime import datetime, timezone
+
+from utils.text import estimate_tokens
+
+
+class ArticleRanker:
+    """综合向量相似度、LLM置信度与时效性为候选文章打分，并按预算选出Top-K
+
+    综合得分 = w_v * 归一化向量分 + w_l * LLM置信度 + w_r * 时效分，
+    时效分按发布时间指数衰减（半衰期可配置）。
+    预算可以按文章数、按估算的分析token数，或两者同时限制。
+    """
+    def __init__(self, weight_vector=0.4, weight_llm=0.4, weight_recency=0.2,
+                 recency_half_life_hours=48, context_token_budget=12000):
+        self.weight_vector = weight_vector
+        self.weight_llm = weight_llm
+        self.weight_recency = weight_recency
+        self.recency_half_life_hours = recency_half_life_hours
+        self.context_token_budget = context_token_budget
+
+    def _recency(self, published, now):
+        if not isinstance(published, datetime):
+            return 0.0
+        if published.tzinfo is None:
+            published = published.replace(tzinfo=timezone.utc)
+        age_hours = max((now - published).total_seconds() / 3600, 0.0)
+        return math.pow(0.5, age_hours / self.recency_half_life_hours)
+
+    def score(self, articles, now=None):
+        """为每篇文章计算综合得分，写入article.rank_score并返回得分列表"""
+        now = now or datetime.now(timezone.utc)
+        vector_scores = [a.vector_score for a in articles if getattr(a, 'vector_score', None) is not None]
+        low, high = (min(vector_scores), max(vector_scores)) if vector_scores else (0.0, 0.0)
+
+        scores = []
+        for article in articles:
+            vector_score = getattr(article, 'vector_score', None)
+            if vector_score is None:
+                vector_norm = 0.0
+            elif high > low:
+                vector_norm = (vector_score - low) / (high - low)
+            else:
+                vector_norm = 1.0
+            confidence = getattr(article, 'llm_confidence', None)
+            confidence = 1.0 if confidence is None else min(max(confidence, 0.0), 1.0)
+
+            article.rank_score = (
+                self.weight_vector * vector_norm
+                + self.weight_llm * confidence
+                + self.weight_recency * self._recency(article.published, now)
+            )
+            scores.append(article.rank_score)
+        return scores
+
+    def estimate_analysis_tokens(self, article):
+        """估算一篇文章深度分析的输入token数：已有全文时按全文估算，上限为上下文预算"""
+        # 全文尚未加载时不为估算而触发查询，按预算上限计
+        if getattr(article, 'is_deferred', None) and article.is_deferred('full_text'):
+            return self.context_token_budget
+        if getattr(article, 'full_text', None):
+            return min(estimate_tokens(article.full_text), self.context_token_budget)
+        return self.context_token_budget
+
+    def select(self, articles, max_articles=None, max_tokens=None):
+        """按综合得分选出预算内的文章
+
+        Args:
+            articles: 候选文章列表
+            max_articles: 最多深度分析的文章数，None或0表示不限
+            max_tokens: 深度分析的token预算，None或0表示不限
+
+        Returns:
+            tuple[list, list]: (入选文章，按得分降序), (超出预算的文章，按得分降序)
+        """
+        scores = self.score(articles)
+        ranked = [(score, index) for index, score in enumerate(scores)]
+
+        if max_articles and not max_tokens:
+            # 只有文章数预算时用堆取Top-K，O(n log k)
+            top = heapq.nlargest(max_articles, ranked)
+            chosen = {index for _, index in top}
+            selected = [articles[index] for _, index in top]
+            overflow = [articles[index] for _, index in sorted(ranked, reverse=True) if index not in chosen]
+            return selected, overflow
+
+        # 有token预算时按得分从高到低依次弹出，装不下的文章进入overflow
+        heap = [(-score, index) for score, index in ranked]
+        heapq.heapify(heap)
+        selected, overflow, used_tokens = [], [], 0
+        while heap:
+            _, index = heapq.heappop(heap)
+            article = articles[index]
+            cost = self.estimate_analysis_tokens(article)
+            if (max_articles and len(selected) >= max_articles) or \
+                    (max_tokens and used_tokens + cost > max_tokens):
+                overflow.append(article)
+                continue
+            selected.append(article)
+            used_tokens += cost
+        return selected, overflow
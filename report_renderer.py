@@ -0,0 +1,170 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+from models import Config
+from utils.logger import Logger
+
+logger = Logger.get_logger('report_renderer')
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template')
+
+PDF_OPTIONS = {
+    'page-size': 'A4',
+    'margin-top': '0.1in',
+    'margin-right': '0.1in',
+    'margin-bottom': '0.2in',
+    'margin-left': '0.1in',
+    'zoom': 1.2,
+    'encoding': 'UTF-8',
+    'quiet': '',
+    'enable-local-file-access': None,
+    'dpi': 500,
+    'image-quality': 100,
+    'header-font-size': '8',
+    'footer-font-size': '8',
+    'enable-smart-shrinking': '',
+}
+
+IMAGE_OPTIONS = {
+    'format': 'png',
+    # 核心参数：缩放倍数与分辨率配合
+    'zoom': 2,          # 关键！2倍缩放相当于2倍物理像素
+    'width': 1248,       # 逻辑像素（与移动端viewport同尺寸）
+
+    # 可选质量增强参数
+    'quality': 100,     # 适用于jpeg格式
+
+    # 渲染引擎优化
+    'disable-smart-width': '',
+    'enable-local-file-access': None  # 允许加载本地资源
+}
+
+
+class ReportRenderer:
+    """报告渲染服务（单例）
+
+    - 所有ArticlePostProcessor共享同一个Jinja环境，模板启动时预编译，
+      编译结果通过文件系统字节码缓存在进程间复用
+    - HTML→PDF/PNG转换在有界的wkhtmltopdf/wkhtmltoimage子进程池中并行执行，
+      每个任务有独立超时，超时后子进程会被终止
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """实现单例模式"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    def __init__(self):
+        if hasattr(self, '_initialized'):
+            return
+        self._initialized = True
+
+        config = Config()
+        self.timeout = config.render_timeout()
+        cache_dir = config.template_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            bytecode_cache=FileSystemBytecodeCache(cache_dir),
+            auto_reload=False,
+        )
+        self.precompile_templates()
+
+        # 真正的渲染工作在wkhtmltopdf子进程中完成，线程只负责等待，
+        # 因此线程池大小即为同时运行的渲染进程数上限
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.render_workers(),
+            thread_name_prefix='report-render'
+        )
+
+    def precompile_templates(self):
+        """预先加载并编译模板目录下的所有模板"""
+        for name in self.env.list_templates(extensions=['html']):
+            try:
+                self.env.get_template(name)
+            except Exception as e:
+                logger.error(f"预编译模板 {name} 失败: {e}")
+
+    def get_template(self, template_name):
+        return self.env.get_template(template_name)
+
+    def render(self, template_name, **template_data):
+        """使用共享环境渲染模板"""
+        return self.env.get_template(template_name).render(**template_data)
+
+    def _run_converter(self, build_command, html_content, output_path, timeout):
+        """构造并运行转换子进程，返回本次运行是否生成了输出文件
+
+        命令在工作线程中构造：缺少pdfkit/imgkit或wkhtmltopdf时只记录错误并返回False
+        """
+        try:
+            command = build_command()
+            # 先删除上次运行留下的同名文件，否则本次失败或超时也会被当作成功
+            try:
+                os.remove(output_path)
+            except FileNotFoundError:
+                pass
+            result = subprocess.run(
+                command,
+                input=html_content.encode('utf-8'),
+                capture_output=True,
+                timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            logger.error(f"渲染超时({timeout}s)，已终止: {output_path}")
+            return False
+        except Exception as e:
+            logger.error(f"渲染失败 {output_path}: {e}")
+            return False
+
+        # wkhtmltopdf在页面资源加载失败时返回1，但通常仍会生成文件
+        if not os.path.exists(output_path):
+            logger.error(f"渲染失败 {output_path}: {result.stderr.decode('utf-8', errors='ignore')[-500:]}")
+            return False
+        logger.info(f"成功导出到: {output_path}")
+        return True
+
+    def submit_pdf(self, html_content, output_path, options=None, timeout=None):
+        """提交HTML→PDF转换任务，返回Future（结果为bool）"""
+        def build_command():
+            import pdfkit
+            return pdfkit.PDFKit(html_content, 'string', options=options or PDF_OPTIONS).command(output_path)
+        return self._executor.submit(
+            self._run_converter, build_command, html_content, output_path, timeout or self.timeout
+        )
+
+    def submit_image(self, html_content, output_path, options=None, timeout=None):
+        """提交HTML→图片转换任务，返回Future（结果为bool）"""
+        def build_command():
+            import imgkit
+            return imgkit.IMGKit(html_content, 'string', options=options or IMAGE_OPTIONS).command(output_path)
+        return self._executor.submit(
+            self._run_converter, build_command, html_content, output_path, timeout or self.timeout
+        )
+
+    def render_many(self, jobs):
+        """并行执行多个转换任务
+
+        Args:
+            jobs: (html_content, output_path, report_type) 列表，report_type为'pdf'或'png'
+
+        Returns:
+            list[bool]: 与jobs顺序一致的结果
+        """
+        futures = [
+            self.submit_pdf(html, path) if report_type == 'pdf' else self.submit_image(html, path)
+            for html, path, report_type in jobs
+        ]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
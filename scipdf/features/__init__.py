@@ -1,7 +1,8 @@
-from .text_utils import compute_readability_stats, compute_text_stats
+from .text_utils import compute_readability_stats, compute_text_stats, compute_corpus_features
 
 __all__ = [
     "compute_readability_stats",
     "compute_text_stats",
+    "compute_corpus_features",
     "compute_journal_features",
 ]
@@ -1,12 +1,27 @@
-import numpy as np
-import pandas as pd
-import textstat
-import spacy
 from collections import Counter
+from functools import lru_cache
 from itertools import groupby
 
+# numpy/pandas/textstat/spacy 均在首次使用时才导入，
+# spaCy模型也只在第一次需要时加载，避免 ``import scipdf`` 的启动开销
+SPACY_MODEL = "en_core_web_sm"
 
-nlp = spacy.load("en_core_web_sm")
+
+@lru_cache(maxsize=None)
+def get_nlp(model: str = SPACY_MODEL):
+    """
+    Load (once) and return the spaCy pipeline used for text features
+    """
+    import spacy
+
+    return spacy.load(model)
+
+
+def __getattr__(name):
+    # 兼容旧代码中的 ``text_utils.nlp``
+    if name == "nlp":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 PRESENT_TENSE_VERB_LIST = ["VB", "VBP", "VBZ", "VBG"]
 VERB_LIST = ["VB", "VBP", "VBZ", "VBG", "VBN", "VBD"]
@@ -46,6 +61,8 @@ def compute_readability_stats(text):
     ==========
     text: str, input section or abstract text
     """
+    import textstat
+
     try:
         readability_dict = {
             "flesch_reading_ease": textstat.flesch_reading_ease(text),
@@ -93,6 +110,8 @@ def compute_text_stats(text):
     ======
     text_stat: dict, part of speech and text features extracted from the given text
     """
+    import numpy as np
+
     try:
         pos = dict(Counter([token.pos_ for token in text]))
         pos_tag = dict(
@@ -139,6 +158,77 @@ def compute_text_stats(text):
     return text_stats_dict
 
 
+# compute_text_stats只用到词性、细粒度标签、词形与分句，批量处理时关闭其余组件
+UNUSED_PIPES = ["ner", "lemmatizer"]
+
+
+def compute_corpus_features(
+    texts,
+    metadata=None,
+    batch_size: int = 64,
+    n_process: int = 1,
+    readability: bool = True,
+    disable=UNUSED_PIPES,
+    model: str = SPACY_MODEL,
+):
+    """
+    Compute text (and readability) features for many sections or papers in one pass,
+    streaming the texts through ``nlp.pipe`` instead of calling ``nlp(text)`` per text
+
+    Parameters
+    ==========
+    texts: iterable of str, section or abstract texts
+    metadata: iterable of dict, optional, one dict per text (e.g. ``{"paper_id": ..., "heading": ...}``),
+        its keys become leading columns of the output
+    batch_size: int, number of texts buffered per spaCy batch
+    n_process: int, number of processes used by ``nlp.pipe``, -1 for all CPUs
+    readability: bool, if True, also compute ``compute_readability_stats`` in the same pass
+    disable: list, spaCy pipeline components to skip
+    model: str, spaCy model name
+
+    Output
+    ======
+    features: pandas.DataFrame, one row per text with metadata, text and readability features
+        scalar features are numeric columns, dictionaries/lists (``pos``, ``pos_tag``, ...) are object columns
+
+    Example
+    =======
+    >> sections = article_dict["sections"]
+    >> features = compute_corpus_features(
+    ..     [s["text"] for s in sections],
+    ..     metadata=[{"heading": s["heading"]} for s in sections],
+    ..     n_process=4,
+    .. )
+    """
+    import pandas as pd
+
+    # texts与metadata都是惰性配对后交给nlp.pipe，语料不会整体读入内存；
+    # 长度不一致时在遍历到较短的一方结尾时抛出ValueError
+    if metadata is None:
+        pairs = ((text, {}) for text in texts)
+    else:
+        pairs = zip(texts, metadata, strict=True)
+
+    nlp = get_nlp(model)
+    disable = [name for name in (disable or []) if name in nlp.pipe_names]
+    docs = nlp.pipe(
+        pairs,
+        as_tuples=True,
+        batch_size=batch_size,
+        n_process=n_process,
+        disable=disable,
+    )
+
+    rows = []
+    for doc, meta in docs:
+        row = dict(meta)
+        row.update(compute_text_stats(doc))
+        if readability:
+            row.update(compute_readability_stats(doc.text))
+        rows.append(row)
+    return pd.DataFrame.from_records(rows)
+
+
 def compute_journal_features(article):
     """
     Parse features about journal references from a given dictionary of parsed article e.g.
@@ -154,6 +244,9 @@ def compute_journal_features(article):
     ======
     reference_dict: dict, dictionary of
     """
+    import numpy as np
+    import pandas as pd
+
     try:
         n_reference = len(article["references"])
         n_unique_journals = len(
@@ -1,4 +1,5 @@
 from .parse_pdf import *
+from .bulk_parse import parse_pdf_corpus, read_manifest, iter_shard_records
 
 __all__ = [
     "list_pdf_paths",
@@ -6,4 +7,7 @@ __all__ = [
     "parse_figure_caption",
     "parse_references",
     "parse_pdf_to_dict",
+    "parse_pdf_corpus",
+    "read_manifest",
+    "iter_shard_records",
 ]
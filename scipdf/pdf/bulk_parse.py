@@ -0,0 +1,270 @@
+"""
+Offline bulk parsing of a PDF corpus into compressed JSONL shards
+
+>> python -m scipdf.pdf.bulk_parse ./pdfs ./parsed --backend grobid --grobid-url http://localhost:8070 --workers 8
+"""
+import argparse
+import gzip
+import json
+import os
+import os.path as op
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from glob import glob
+
+from .parse_pdf import GROBID_URL, parse_pdf_to_dict, validate_url
+
+SHARD_PATTERN = "shard-{:05d}.jsonl.gz"
+BACKENDS = ("grobid", "local", "auto")
+
+
+def read_manifest(source: str):
+    """
+    Read the list of documents to parse
+
+    Parameters
+    ==========
+    source: str, either a folder (all ``*.pdf`` below it are used, the file name without
+        extension is the document id), a text manifest with one path or URL per line,
+        or a JSONL manifest with ``{"id": ..., "pdf": ...}`` per line
+
+    Output
+    ======
+    documents: list of dict, ``[{"id": ..., "pdf": ...}, ...]``
+    """
+    if op.isdir(source):
+        paths = sorted(glob(op.join(source, "**", "*.pdf"), recursive=True))
+        return [{"id": op.splitext(op.basename(path))[0], "pdf": path} for path in paths]
+
+    documents = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                documents.append({"id": str(record["id"]), "pdf": record["pdf"]})
+            else:
+                documents.append({"id": line, "pdf": line})
+    return documents
+
+
+def parse_pdf_local(pdf_path: str):
+    """
+    Parse a PDF with PyMuPDF only (no GROBID), splitting sections by the PDF outline when available
+
+    Parameters
+    ==========
+    pdf_path: str, path or URL to the PDF
+
+    Output
+    ======
+    article_dict: dict, same top-level keys as ``parse_pdf_to_dict`` for the fields that can be
+        recovered without GROBID (``title``, ``abstract``, ``sections``)
+    """
+    import fitz
+
+    if validate_url(pdf_path):
+        import urllib.request
+
+        data = urllib.request.urlopen(pdf_path).read()
+        doc = fitz.open(stream=data, filetype="pdf")
+    else:
+        doc = fitz.open(pdf_path)
+
+    with doc:
+        pages = [page.get_text() for page in doc]
+        toc = [(level, title, page) for level, title, page in doc.get_toc() if level == 1]
+        title = (doc.metadata or {}).get("title") or ""
+
+    sections = []
+    if toc:
+        for i, (_, heading, start_page) in enumerate(toc):
+            end_page = toc[i + 1][2] if i + 1 < len(toc) else len(pages) + 1
+            text = "\n".join(pages[max(start_page - 1, 0):max(end_page - 1, start_page)])
+            sections.append({"heading": heading.strip(), "text": text.strip()})
+    else:
+        sections.append({"heading": "", "text": "\n".join(pages).strip()})
+    return {"title": title, "abstract": "", "sections": sections, "n_pages": len(pages)}
+
+
+def _parse_document(document: dict, backend: str, grobid_urls: list):
+    """Parse one manifest entry, returning a JSON-serializable record (never raises)"""
+    start = time.time()
+    record = {"id": document["id"], "pdf": document["pdf"], "backend": None, "error": None}
+    backends = ["grobid", "local"] if backend == "auto" else [backend]
+    for name in backends:
+        try:
+            if name == "grobid":
+                article = parse_pdf_to_dict(
+                    document["pdf"],
+                    as_list=False,
+                    return_coordinates=False,
+                    grobid_url=random.choice(grobid_urls),
+                )
+                if article is None:
+                    raise ValueError("GROBID returned no document")
+            else:
+                article = parse_pdf_local(document["pdf"])
+            record.update(
+                backend=name,
+                error=None,
+                title=article.get("title", ""),
+                abstract=article.get("abstract", ""),
+                sections=[{"heading": s["heading"], "text": s["text"]} for s in article["sections"]],
+            )
+            break
+        except Exception as e:
+            record["error"] = f"{name}: {e}"
+    record["seconds"] = round(time.time() - start, 3)
+    return record
+
+
+def completed_ids(output_dir: str):
+    """
+    Collect ids already written to the shards in ``output_dir`` (successful records only),
+    tolerating a truncated last shard left by an interrupted run
+    """
+    done = set()
+    for shard in sorted(glob(op.join(output_dir, "shard-*.jsonl.gz"))):
+        try:
+            with gzip.open(shard, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if not record.get("error"):
+                        done.add(record["id"])
+        except (EOFError, OSError):
+            # interrupted run: keep what was readable
+            continue
+    return done
+
+
+def iter_shard_records(output_dir: str):
+    """
+    Iterate over all successfully parsed records in the shards of ``output_dir``
+    """
+    for shard in sorted(glob(op.join(output_dir, "shard-*.jsonl.gz"))):
+        try:
+            with gzip.open(shard, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if not record.get("error"):
+                        yield record
+        except (EOFError, OSError):
+            continue
+
+
+def _next_shard_index(output_dir: str):
+    indices = [
+        int(op.basename(path)[len("shard-"):-len(".jsonl.gz")])
+        for path in glob(op.join(output_dir, "shard-*.jsonl.gz"))
+    ]
+    return max(indices) + 1 if indices else 0
+
+
+def parse_pdf_corpus(
+    documents: list,
+    output_dir: str,
+    backend: str = "grobid",
+    grobid_urls: list = None,
+    n_workers: int = 4,
+    shard_size: int = 500,
+    resume: bool = True,
+    log_every: int = 50,
+):
+    """
+    Parse many PDFs with a worker pool and write the results to compressed JSONL shards
+
+    GROBID parsing is network bound and runs in a thread pool; the local PyMuPDF backend
+    is CPU bound and runs in a process pool. Every run writes new shards, so an interrupted
+    run never corrupts finished shards and ``resume`` simply skips ids already written.
+
+    Parameters
+    ==========
+    documents: list of dict, ``[{"id": ..., "pdf": ...}, ...]`` see ``read_manifest``
+    output_dir: str, folder for ``shard-XXXXX.jsonl.gz`` files
+    backend: str, ``grobid``, ``local`` or ``auto`` (GROBID first, local on failure)
+    grobid_urls: list of str, GROBID servers, one is picked at random per document
+    n_workers: int, size of the worker pool
+    shard_size: int, number of records per shard
+    resume: bool, skip documents already parsed successfully in ``output_dir``
+    log_every: int, print throughput every ``log_every`` documents
+
+    Output
+    ======
+    stats: dict, ``{"total", "skipped", "parsed", "failed", "seconds", "docs_per_second"}``
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    grobid_urls = [url.rstrip("/") for url in (grobid_urls or [GROBID_URL])]
+    os.makedirs(output_dir, exist_ok=True)
+
+    done = completed_ids(output_dir) if resume else set()
+    pending = [document for document in documents if document["id"] not in done]
+    stats = {"total": len(documents), "skipped": len(documents) - len(pending), "parsed": 0, "failed": 0}
+
+    shard_index = _next_shard_index(output_dir)
+    shard, shard_count = None, 0
+    start = time.time()
+    executor_cls = ProcessPoolExecutor if backend == "local" else ThreadPoolExecutor
+    try:
+        with executor_cls(max_workers=n_workers) as executor:
+            futures = [executor.submit(_parse_document, document, backend, grobid_urls) for document in pending]
+            for n_done, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                if shard is None or shard_count >= shard_size:
+                    if shard is not None:
+                        shard.close()
+                    shard = gzip.open(op.join(output_dir, SHARD_PATTERN.format(shard_index)), "wt", encoding="utf-8")
+                    shard_index, shard_count = shard_index + 1, 0
+                shard.write(json.dumps(record, ensure_ascii=False) + "\n")
+                shard_count += 1
+                stats["failed" if record["error"] else "parsed"] += 1
+
+                if n_done % log_every == 0:
+                    elapsed = time.time() - start
+                    print(f"{n_done}/{len(pending)} parsed, {n_done / elapsed:.2f} docs/s, {stats['failed']} failed")
+    finally:
+        if shard is not None:
+            shard.close()
+
+    elapsed = time.time() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["docs_per_second"] = round((stats["parsed"] + stats["failed"]) / elapsed, 2) if elapsed > 0 else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk parse a folder or manifest of PDFs into JSONL shards")
+    parser.add_argument("source", help="folder of PDFs, text manifest (one path/URL per line) or JSONL manifest")
+    parser.add_argument("output_dir", help="folder for the compressed JSONL shards")
+    parser.add_argument("--backend", choices=BACKENDS, default="grobid")
+    parser.add_argument("--grobid-url", action="append", dest="grobid_urls", help="may be given several times")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--shard-size", type=int, default=500)
+    parser.add_argument("--no-resume", action="store_true", help="re-parse documents already in output_dir")
+    args = parser.parse_args(argv)
+
+    stats = parse_pdf_corpus(
+        read_manifest(args.source),
+        args.output_dir,
+        backend=args.backend,
+        grobid_urls=args.grobid_urls,
+        n_workers=args.workers,
+        shard_size=args.shard_size,
+        resume=not args.no_resume,
+    )
+    print(json.dumps(stats, ensure_ascii=False))
+    return stats
+
+
+if __name__ == "__main__":
+    main()
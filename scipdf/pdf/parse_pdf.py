@@ -2,15 +2,11 @@ import re
 import os
 import os.path as op
 from glob import glob
-import urllib
+import urllib.request
 from typing import Dict 
 import subprocess
-import requests
-import fitz
-from PIL import Image
-import io
-from bs4 import BeautifulSoup, NavigableString
-from tqdm import tqdm, tqdm_notebook
+
+# requests与BeautifulSoup在真正解析时才导入，避免 ``import scipdf`` 拖慢启动
 
 
 GROBID_URL = "http://localhost:8070"
@@ -74,6 +70,9 @@ def parse_pdf(
     =======
     >> parsed_article = parse_pdf(pdf_path, fulltext=True, soup=True)
     """
+    import requests
+    from bs4 import BeautifulSoup
+
     # GROBID URL
     if fulltext:
         url = "%s/api/processFulltextDocument" % grobid_url
@@ -153,6 +152,8 @@ def parse_abstract(article):
     """
     Parse abstract from a given BeautifulSoup of an article
     """
+    from bs4 import NavigableString
+
     div = article.find("abstract")
     abstract = ""
     for p in list(div.children):
@@ -182,6 +183,8 @@ def parse_sections(article, as_list: bool = False):
     as_list: bool, if True, output text as a list of paragraph instead
         of joining it together as one single text
     """
+    from bs4 import NavigableString
+
     article_text = article.find("text")
     divs = article_text.find_all("div", attrs={"xmlns": "http://www.tei-c.org/ns/1.0"})
     sections = []
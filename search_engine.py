@@ -1,17 +1,28 @@
 import json
 import os
 import pickle
-from openai import OpenAI
-from pymilvus import MilvusClient, DataType
-from models import LLMModel, Database, Config
-from articles_processor import ArticlePostProcessor
+from models import LLMModel, Database, Config, published_window, BEIJING_TZ
 import pytz
 from datetime import datetime, timedelta, timezone
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 logger = logging.getLogger(__name__)
+# pymilvus、openai 以及报告渲染相关依赖在首次使用时才导入，缩短启动时间
+
+EMBEDDING_MODEL = "text-embedding-v3"
+EMBEDDING_DIMENSIONS = 1024
+# 修改关键词提取prompt时递增，已持久化的订阅关键词与向量会随之失效并重新计算
+KEYWORDS_PROMPT_VERSION = "1"
+QUERY_FEATURES_VERSION = f"{KEYWORDS_PROMPT_VERSION}:{EMBEDDING_MODEL}:{EMBEDDING_DIMENSIONS}"
+# 进程内缓存的文章向量上限，超过后清空
+ARTICLE_VECTOR_CACHE_SIZE = 50000
+
+class KeywordExtractionError(Exception):
+    """LLM关键词提取失败（调用出错或返回内容无法解析）"""
+
 
 class VectorCache:
     """向量缓存管理类"""
@@ -88,6 +99,7 @@ class VectorDB:
         self._lock = threading.Lock()
         
         self.config = Config()
+        from openai import OpenAI
         
         # 使用服务器模式配置
         self.uri = self.config.vectordb_config()['uri']  # Milvus 服务器地址
@@ -100,12 +112,15 @@ class VectorDB:
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
         )
         self.vector_cache = VectorCache()
+        # entry_id -> 文章向量，候选文章打分时避免重复查询Milvus
+        self._article_vectors = {}
         
         # 初始化连接
         self._init_connection()
         
     def _init_connection(self, max_retries=3, retry_delay=5):
         """初始化数据库连接，带重试机制"""
+        from pymilvus import MilvusClient
         for attempt in range(max_retries):
             try:
                 with self._lock:
@@ -154,6 +169,7 @@ class VectorDB:
 
     def init_collection(self):
         """初始化集合"""
+        from pymilvus import MilvusClient, DataType
         try:
             collection_name = "articles"
             client = self._ensure_connection()
@@ -261,6 +277,7 @@ class VectorDB:
                     collection_name="articles",
                     data={
                         "vector": vector,
+                        "entry_id": article.entry_id,  # 动态字段，按entry_id读取候选文章的向量
                         "title": article.title,
                         "abstract": article.summary,
                         "categories": categories,  # 存储所有类别
@@ -279,22 +296,24 @@ class VectorDB:
                 else:
                     return False
 
-    def search_similar_articles(self, query, category, threshold=0.1, limit=1000, max_retries=3):
-        """搜索相似文章"""
+    def search_similar_articles(self, query, category, threshold=0.1, limit=1000, max_retries=3, query_vector=None,
+                                window=None):
+        """搜索相似文章，提供query_vector时不再为query计算embedding
+
+        window为发布时间窗口 (start, end)，默认与MySQL阶段相同，取[window] days配置
+        """
+        if window is None:
+            window = published_window(self.config.window_days())
         for attempt in range(max_retries):
             try:
                 client = self._ensure_connection()
-                query_vector = self.get_embedding(query)
+                if query_vector is None:
+                    query_vector = self.get_embedding(query)
                 
-                # 获取北京时间的时间范围，过滤最近一天的文章从昨天0点到今天零点
                 beijing_tz = pytz.timezone('Asia/Shanghai')
-                now = datetime.now(beijing_tz)
-                today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                yesterday_start = today_start - timedelta(days=3)
-                
                 # 转换为时间戳 
-                start_timestamp = int(yesterday_start.timestamp())
-                end_timestamp = int(today_start.timestamp())
+                start_timestamp = int(window[0].timestamp())
+                end_timestamp = int(window[1].timestamp())
                 
                 # 构建过滤表达式（根据官方文档修正）
                 filter_expr = f'published_time >= {start_timestamp} && published_time < {end_timestamp}'
@@ -332,11 +351,12 @@ class VectorDB:
                 else:
                     return []
 
-    def search_similar_articles_without_time(self, query, category, threshold=0.1, limit=1000):
+    def search_similar_articles_without_time(self, query, category, threshold=0.1, limit=1000, query_vector=None):
         """根据类别和时间范围过滤文章,然后搜索相似文章"""
         collection_name = "articles"
         
-        query_vector = self.get_embedding(query)
+        if query_vector is None:
+            query_vector = self.get_embedding(query)
         filter_expr = f"ARRAY_CONTAINS(categories, '{category}')"
         
         try:
@@ -368,6 +388,57 @@ class VectorDB:
             print(f"搜索相似文章时出错: {e}")
             return []
 
+    def get_article_vectors(self, articles, chunk_size=200):
+        """按entry_id读取候选文章已入库的向量，不做相似度检索，也不传输摘要
+
+        依次查找进程内缓存、按入库文本（标题+摘要）缓存的向量，其余的用Milvus的query按entry_id批量读取；
+        entry_id字段加入之前入库的文章再按标题读取。
+
+        Returns:
+            dict: {entry_id: vector}，找不到向量的文章不在其中
+        """
+        vectors, missing = {}, []
+        for article in articles:
+            vector = self._article_vectors.get(article.entry_id)
+            if vector is None:
+                vector = self.vector_cache.get(f"{article.title} {article.summary}")
+            if vector is not None:
+                vectors[article.entry_id] = vector
+            else:
+                missing.append(article)
+        if not missing:
+            return vectors
+
+        try:
+            client = self._ensure_connection()
+            for i in range(0, len(missing), chunk_size):
+                ids = [article.entry_id for article in missing[i:i + chunk_size]]
+                rows = client.query(
+                    collection_name="articles",
+                    filter=f"entry_id in {json.dumps(ids)}",
+                    output_fields=["entry_id", "vector"],
+                )
+                for row in rows:
+                    vectors[row['entry_id']] = row['vector']
+
+            untagged = [article for article in missing if article.entry_id not in vectors]
+            for i in range(0, len(untagged), chunk_size):
+                by_title = {article.title: article.entry_id for article in untagged[i:i + chunk_size]}
+                rows = client.query(
+                    collection_name="articles",
+                    filter=f"title in {json.dumps(list(by_title), ensure_ascii=False)}",
+                    output_fields=["title", "vector"],
+                )
+                for row in rows:
+                    vectors[by_title[row['title']]] = row['vector']
+        except Exception as e:
+            logger.error(f"读取候选文章向量失败: {e}")
+
+        if len(self._article_vectors) > ARTICLE_VECTOR_CACHE_SIZE:
+            self._article_vectors.clear()
+        self._article_vectors.update(vectors)
+        return vectors
+
     def get_embedding(self, text):
         """获取文本的embedding向量，优先使用缓存"""
         cached_vector = self.vector_cache.get(text)
@@ -376,9 +447,9 @@ class VectorDB:
         
         try:
             completion = self.embedding_client.embeddings.create(
-                model="text-embedding-v3",
+                model=EMBEDDING_MODEL,
                 input=text,
-                dimensions=1024,
+                dimensions=EMBEDDING_DIMENSIONS,
                 encoding_format="float"
             )
             
@@ -405,14 +476,22 @@ class SearchProcessor:
         self.db = Database(db_config)
         self.llm = llm
         self.config = Config()
-        # 将向量数据库初始化改为延迟加载
+        # 将向量数据库与OpenAI客户端的初始化改为延迟加载
         self._vector_db = None
-        
-        # 初始化OpenAI客户端
-        self.embedding_client = OpenAI(
-            api_key=self.config.api_key(),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        ) 
+        self._embedding_client = None
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+
+    @property
+    def embedding_client(self):
+        """延迟初始化OpenAI客户端"""
+        if self._embedding_client is None:
+            from openai import OpenAI
+            self._embedding_client = OpenAI(
+                api_key=self.config.api_key(),
+                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
+            )
+        return self._embedding_client
     
     @property
     def vector_db(self):
@@ -421,6 +500,21 @@ class SearchProcessor:
             self._vector_db = VectorDB()
         return self._vector_db
     
+    @property
+    def snapshot(self):
+        """当前窗口的文章快照，[snapshot] enabled=false时为None"""
+        if self._snapshot is None and self.config.snapshot_enabled():
+            # 多个订阅线程可能同时首次访问，只创建一份快照与索引
+            with self._snapshot_lock:
+                if self._snapshot is None:
+                    from article_snapshot import ArticleSnapshot
+                    bm25 = None
+                    if self.config.keyword_backend() == 'bm25':
+                        from bm25_index import BM25Index
+                        bm25 = BM25Index(include_cn=self.config.bm25_include_cn())
+                    self._snapshot = ArticleSnapshot(self.db, self.config.snapshot_refresh_seconds(), bm25=bm25)
+        return self._snapshot
+
     def insert_article_to_vector_db(self, article):
         """
         插入文章到向量数据库
@@ -433,21 +527,30 @@ class SearchProcessor:
         """
         return self.vector_db.insert_article(article)
     
-    def search_similar_articles(self, query, category, threshold=0.1, limit=50):
+    def published_window(self, start=None):
+        """文章发布时间窗口，MySQL获取与向量检索共用；start为订阅的投递水位"""
+        return published_window(self.config.window_days(), start=start)
+
+    def search_similar_articles(self, query, category, threshold=0.1, limit=50, query_vector=None, window=None):
         """搜索相似文章"""
-        return self.vector_db.search_similar_articles(query, category, threshold, limit)
+        return self.vector_db.search_similar_articles(
+            query, category, threshold, limit, query_vector=query_vector, window=window or self.published_window()
+        )
     
-    def search_similar_articles_without_time(self, query, category, threshold=0.1, limit=50):
+    def search_similar_articles_without_time(self, query, category, threshold=0.1, limit=50, query_vector=None):
         """搜索相似文章, 不添加时间条件"""
-        return self.vector_db.search_similar_articles_without_time(query, category, threshold, limit)
+        return self.vector_db.search_similar_articles_without_time(
+            query, category, threshold, limit, query_vector=query_vector
+        )
 
     
-    def extract_keywords_qwen(self, query):
+    def extract_keywords_qwen(self, query, strict=False):
         """
         使用千问模型提取查询中的关键词
         
         参数:
         - query: 用户的查询字符串
+        - strict: 为True时提取失败抛出KeywordExtractionError，而不是降级为简单分词
         
         返回:
         - keywords: 提取出的关键词列表
@@ -481,22 +584,100 @@ class SearchProcessor:
             
             keywords_str = response.strip()
             try:
-                return json.loads(keywords_str)
+                keywords = json.loads(keywords_str)
             except json.JSONDecodeError:
-                print(f"无法解析关键词JSON: {keywords_str}")
-                return query.split()  # 降级为简单分词
+                keywords = None
+            if not (isinstance(keywords, list) and keywords and all(isinstance(k, str) for k in keywords)):
+                raise KeywordExtractionError(f"无法解析关键词JSON: {keywords_str}")
+            return keywords
                 
         except Exception as e:
-            print(f"千问API调用出错: {e}")
+            if strict:
+                if isinstance(e, KeywordExtractionError):
+                    raise
+                raise KeywordExtractionError(f"千问API调用出错: {e}") from e
+            print(f"关键词提取失败，降级为简单分词: {e}")
             return query.split()  # 降级为简单分词
     
-    def keyword_filter(self, query, articles):
-        """第一阶段：关键词预过滤"""
-        # 使用Coze API或千问API提取关键词
-        # keywords = self.extract_keywords_coze(query)  # 使用Coze
-        keywords = self.extract_keywords_qwen(query)    # 使用千问
-        print("得到的关键词为:", keywords)
+    def compute_query_features(self, query):
+        """
+        计算查询的关键词及关键词embedding，订阅内容不变时可持久化复用
+        
+        关键词提取失败时抛出KeywordExtractionError，不返回降级的分词结果，避免其被持久化
+        
+        返回:
+        - keywords: 关键词列表
+        - query_vector: " ".join(keywords) 的embedding
+        """
+        keywords = self.extract_keywords_qwen(query, strict=True)
+        return keywords, self.vector_db.get_embedding(" ".join(keywords))
+
+    def keyword_filter(self, query, articles=None, category=None, keywords=None, window=None, limit=None):
+        """
+        第一阶段：关键词预过滤
+        
+        [keyword] backend=fulltext时把关键词作为MATCH ... AGAINST（布尔模式）与时间窗口、类别条件
+        一起下推到MySQL，只有命中的文章从数据库返回；bm25时查询文章快照维护的进程内BM25索引；
+        substring时在内存中做子串匹配。
+        
+        参数:
+        - query: 用户查询字符串
+        - articles: 候选文章，提供时结果只保留其中命中的文章；为None时直接返回数据库中命中的文章
+        - category: 文章类别，None表示所有类别
+        - keywords: 预先计算的关键词，为None时调用LLM提取
+        - window: 发布时间窗口，默认按[window] days配置
+        - limit: fulltext时最多返回的文章数
+        
+        返回:
+        - filtered_articles: 命中关键词的文章列表，fulltext与bm25时按相关度降序并带有keyword_score
+        """
+        if keywords is None:
+            # 使用Coze API或千问API提取关键词
+            # keywords = self.extract_keywords_coze(query)  # 使用Coze
+            keywords = self.extract_keywords_qwen(query)    # 使用千问
+            print("得到的关键词为:", keywords)
+
+        backend = self.config.keyword_backend()
+        if backend == 'bm25' and self.snapshot is not None and self.snapshot.bm25 is not None:
+            window = window or self.published_window()
+            if articles is None:
+                articles = [
+                    record.to_article(loader=self.db.load_columns, tz=BEIJING_TZ)
+                    for record in self.snapshot.records(category, window)
+                ]
+            else:
+                # 保证候选文章所在的窗口已建立索引
+                self.snapshot.ensure(window)
+            scores = dict(self.snapshot.bm25.search(
+                keywords, candidates=[article.entry_id for article in articles], limit=limit
+            ))
+            filtered_articles = []
+            for article in articles:
+                if article.entry_id in scores:
+                    article.keyword_score = scores[article.entry_id]
+                    filtered_articles.append(article)
+            filtered_articles.sort(key=lambda article: article.keyword_score, reverse=True)
+            return filtered_articles
+
+        if backend == 'fulltext':
+            matched = self.db.fulltext_search(
+                keywords, category, limit=limit, window=window or self.published_window(),
+                title_weight=self.config.keyword_title_weight()
+            )
+            if articles is None:
+                return matched
+            scores = {article.entry_id: article.keyword_score for article in matched}
+            filtered_articles = []
+            for article in articles:
+                if article.entry_id in scores:
+                    article.keyword_score = scores[article.entry_id]
+                    filtered_articles.append(article)
+            filtered_articles.sort(key=lambda article: article.keyword_score, reverse=True)
+            return filtered_articles
+
         # 关键词过滤
+        if articles is None:
+            articles = self.fetch_articles_from_db(category, limit=limit, window=window, profile='filter')
         filtered_articles = []
         for article in articles:
             text = f"{article.title.lower()} {article.summary.lower()}"
@@ -505,7 +686,8 @@ class SearchProcessor:
                 
         return filtered_articles
     
-    def embedding_filter(self, query, articles, category, threshold=0.3):
+    def embedding_filter(self, query, articles, category, threshold=0.3, keywords=None, query_vector=None,
+                         window=None):
         """
         第二阶段：embedding相似度过滤
         
@@ -513,30 +695,192 @@ class SearchProcessor:
         - query: 用户查询字符串
         - articles: 待过滤的文章列表
         - threshold: 相似度阈值
+        - keywords: 预先计算的关键词，为None时调用LLM提取
+        - query_vector: 预先计算的关键词embedding，与keywords一起提供时跳过embedding调用
+        - window: 发布时间窗口，应与获取articles时使用的窗口一致
         
         返回:
         - filtered_articles: 经过embedding过滤的文章列表
         - keywords: 提取出的关键词列表
         """
-        # 使用search_similar_articles获取相似文章
         # 改为针对query中的关键词进行相似度匹配
-        keywords = self.extract_keywords_qwen(query)
+        if keywords is None:
+            keywords = self.extract_keywords_qwen(query)
+            query_vector = None
         # print(f"\n测试查询: {query}")
         # print(f"\n测试查询关键词为: {keywords}")
+        matches = self.vector_matches(
+            " ".join(keywords), articles, category, threshold=threshold, query_vector=query_vector, window=window
+        )
+        # 记录向量相似度，供排序阶段使用；保持原文章顺序
+        matched = set()
+        for article, score in matches:
+            article.vector_score = score
+            matched.add(id(article))
+        filtered_articles = [article for article in articles if id(article) in matched]
+                
+        return filtered_articles, keywords
+
+    def vector_scores(self, articles, query_vector):
+        """
+        候选文章与查询向量的余弦相似度，一次矩阵运算完成
+        
+        返回:
+        - numpy.ndarray: 与articles一一对应的得分，没有向量的文章为nan
+        """
+        import numpy as np
+        vectors = self.vector_db.get_article_vectors(articles)
+        query = np.asarray(query_vector, dtype=np.float32)
+        matrix = np.full((len(articles), query.shape[0]), np.nan, dtype=np.float32)
+        for i, article in enumerate(articles):
+            vector = vectors.get(article.entry_id)
+            if vector is not None:
+                matrix[i] = vector
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (matrix @ query) / (np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0))
+
+    def vector_matches(self, query_text, articles, category, threshold=0.3, query_vector=None, window=None):
+        """
+        向量阶段：找出与查询相似度不低于threshold的候选文章
+        
+        [retrieval] vector_scoring=candidates时只读取候选文章的向量并在本地打分；
+        search时在Milvus中检索整个窗口，再按标题与候选文章对应。
+        
+        返回:
+        - list[(Article, score)]: 按相似度降序
+        """
+        if self.config.retrieval_config()['vector_scoring'] == 'candidates':
+            if query_vector is None:
+                query_vector = self.vector_db.get_embedding(query_text)
+            scores = self.vector_scores(articles, query_vector)
+            # nan（没有向量）与任何阈值比较都为False
+            matches = [(article, float(score)) for article, score in zip(articles, scores) if score >= threshold]
+            matches.sort(key=lambda match: match[1], reverse=True)
+            return matches
+
         # similar_results = self.search_similar_articles(query,category, threshold=threshold)
-        similar_results = self.search_similar_articles(" ".join(keywords), category, threshold=threshold)
+        similar_results = self.search_similar_articles(
+            query_text, category, threshold=threshold, query_vector=query_vector, window=window
+        )
         # similar_results = self.search_similar_articles_without_time(" ".join(keywords), category, threshold=threshold)
-        # print("similar_results", similar_results)
-        # 根据搜索结果过滤原文章列表
-        filtered_articles = []
-        similar_titles = {result['title'] for result in similar_results}  # 使用集合提高查找效率
+        by_title = {}
         for article in articles:
-            if article.title in similar_titles:
-                filtered_articles.append(article)
-                
-        return filtered_articles, keywords
+            by_title.setdefault(article.title, article)
+        matches, matched = [], set()
+        for result in similar_results:
+            article = by_title.get(result['title'])
+            if article is not None and id(article) not in matched:
+                matched.add(id(article))
+                matches.append((article, result['score']))
+        return matches
     
-    def llm_filter(self, query, articles, keywords, batch_size=10):
+    def hybrid_filter(self, query, articles, category, threshold=0.3, keywords=None, query_vector=None,
+                      window=None, top_n=None, rrf_k=None):
+        """
+        混合检索：关键词检索与向量检索并行执行，用倒数排名融合(RRF)合并，替代embedding_filter
+        
+        两路结果取并集，每篇文章的融合得分为 Σ 1 / (rrf_k + 该路中的名次)，
+        任一路命中的文章都不会丢失；按融合得分取前top_n篇交给LLM阶段。
+        
+        参数:
+        - query: 用户查询字符串
+        - articles: 候选文章列表（当前窗口）
+        - threshold: 向量检索的相似度阈值
+        - keywords, query_vector: 预先计算的关键词与关键词embedding
+        - window: 发布时间窗口，应与获取articles时使用的窗口一致
+        - top_n: 融合后保留的文章数，默认取[retrieval] top_n
+        - rrf_k: RRF平滑常数，默认取[retrieval] rrf_k
+        
+        返回:
+        - fused_articles: 按融合得分降序的文章列表（带有vector_score与keyword_score）
+        - keywords: 关键词列表
+        """
+        retrieval_config = self.config.retrieval_config()
+        top_n = retrieval_config['top_n'] if top_n is None else top_n
+        rrf_k = retrieval_config['rrf_k'] if rrf_k is None else rrf_k
+        if keywords is None:
+            keywords = self.extract_keywords_qwen(query)
+            query_vector = None
+        window = window or self.published_window()
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='hybrid') as pool:
+            lexical_future = pool.submit(
+                self.keyword_filter, query, articles, category, keywords=keywords, window=window
+            )
+            vector_future = pool.submit(
+                self.vector_matches, " ".join(keywords), articles, category,
+                threshold=threshold, query_vector=query_vector, window=window
+            )
+            # 任一路失败都只使用另一路的结果，两路都失败时返回空列表
+            try:
+                lexical = lexical_future.result()
+            except Exception as e:
+                logger.error(f"关键词检索失败，只使用向量检索结果: {e}")
+                lexical = []
+            try:
+                vector_matches = vector_future.result()
+            except Exception as e:
+                logger.error(f"向量检索失败，只使用关键词检索结果: {e}")
+                vector_matches = []
+
+        vector_ranked = []
+        for article, score in vector_matches:
+            article.vector_score = score
+            vector_ranked.append(article)
+
+        fused = {}
+        for ranked in (lexical, vector_ranked):
+            for rank, article in enumerate(ranked, 1):
+                fused[id(article)] = fused.get(id(article), 0.0) + 1.0 / (rrf_k + rank)
+        fused_articles = {id(article): article for article in lexical + vector_ranked}
+        ordered = sorted(fused_articles.values(), key=lambda article: fused[id(article)], reverse=True)
+        logger.info(
+            f"混合检索：关键词命中 {len(lexical)} 篇，向量命中 {len(vector_ranked)} 篇，"
+            f"融合后 {len(ordered)} 篇，保留前 {top_n or len(ordered)} 篇"
+        )
+        return (ordered[:top_n] if top_n else ordered), keywords
+
+    def historical_embedding_filter(self, query, category, limit=None, threshold=0.3, fetch_size=500,
+                                    keywords=None, query_vector=None, search_limit=1000):
+        """
+        历史检索的embedding过滤：不限时间，流式读取数据库中的文章
+        
+        向量检索只执行一次，数据库文章按fetch_size分批读取并立即过滤，
+        内存中只保留命中的文章，与limit大小无关。
+        
+        参数:
+        - query: 用户查询字符串
+        - category: 文章主分类
+        - limit: 最多扫描的文章数，None表示不限
+        - fetch_size: 每批从数据库读取的文章数
+        - keywords, query_vector: 预先计算的关键词与关键词embedding
+        - search_limit: 向量检索返回的最大结果数
+        
+        返回:
+        - filtered_articles: 经过embedding过滤的文章列表
+        - keywords: 关键词列表
+        """
+        if keywords is None:
+            keywords = self.extract_keywords_qwen(query)
+            query_vector = None
+        similar_results = self.search_similar_articles_without_time(
+            " ".join(keywords), category, threshold=threshold, limit=search_limit, query_vector=query_vector
+        )
+        similar_scores = {result['title']: result['score'] for result in similar_results}
+        if not similar_scores:
+            return [], keywords
+
+        # 扫描阶段只持有紧凑的ArticleRecord，命中的文章才转换为Article
+        filtered_articles = []
+        for batch in self.db.iter_articles_from_db_without_time(
+                category, limit=limit, fetch_size=fetch_size, batch_size=fetch_size, records=True):
+            for record in batch:
+                if record.title in similar_scores:
+                    record.vector_score = similar_scores[record.title]
+                    filtered_articles.append(record.to_article(loader=self.db.load_columns))
+        return filtered_articles, keywords
+
+    def llm_filter(self, query, articles, keywords, batch_size=10, cluster=None, verdict_cache=None):
         """
         第三阶段：LLM精准判断（批量处理）
         
@@ -544,35 +888,81 @@ class SearchProcessor:
         - query: 用户查询字符串
         - articles: 待过滤的文章列表
         - batch_size: 批量处理大小，默认10篇
+        - cluster: 查询所在的QueryCluster，与verdict_cache同时提供时按簇代表查询判断
+        - verdict_cache: VerdictCache，同簇订阅已判断过的文章直接复用结果
         
         返回:
         - filtered_articles: 经过LLM判断的文章列表
         """
-        filtered_articles = []
         llm = LLMModel(model="deepseek-r1")
+        if cluster is None or verdict_cache is None:
+            verdicts = {}
+            for i in range(0, len(articles), batch_size):
+                verdicts.update(self._llm_judge_batch(llm, query, keywords, articles[i:i + batch_size]) or {})
+            return self._apply_verdicts(articles, verdicts)
+
+        # 同一簇的过滤串行执行，后到的订阅直接命中前一个订阅写入的判断
+        with verdict_cache.cluster_lock(cluster.key):
+            if cluster.keywords is None:
+                cluster.keywords = keywords if query == cluster.query else self.extract_keywords_qwen(cluster.query)
+
+            verdicts, pending = {}, []
+            for article in articles:
+                verdict = verdict_cache.get(cluster.key, article.entry_id)
+                if verdict is None:
+                    pending.append(article)
+                else:
+                    verdicts[article.entry_id] = verdict
+            print(f"簇 {cluster.key} 复用 {len(verdicts)} 篇文章的判断，待LLM判断 {len(pending)} 篇")
+
+            for i in range(0, len(pending), batch_size):
+                batch = pending[i:i + batch_size]
+                batch_verdicts = self._llm_judge_batch(llm, cluster.query, cluster.keywords, batch)
+                if batch_verdicts is None:
+                    # 调用失败的批次不写入缓存，留给同簇的下一个订阅重试
+                    continue
+                for article in batch:
+                    verdict = batch_verdicts.get(article.entry_id, (False, None))
+                    verdict_cache.set(cluster.key, article.entry_id, *verdict)
+                    verdicts[article.entry_id] = verdict
+        return self._apply_verdicts(articles, verdicts)
+
+    @staticmethod
+    def _apply_verdicts(articles, verdicts):
+        """按输入顺序保留判断为相关的文章，并记录置信度"""
+        filtered_articles = []
+        for article in articles:
+            relevant, confidence = verdicts.get(article.entry_id, (False, None))
+            if relevant:
+                article.llm_confidence = confidence
+                filtered_articles.append(article)
+        return filtered_articles
+
+    def _llm_judge_batch(self, llm, query, keywords, batch):
+        """对一批文章调用LLM判断相关性
+
+        返回:
+        - {entry_id: (是否相关, 置信度)}，只包含相关文章；调用或解析失败时返回None
+        """
+        # 构建批量文章的文本
+        articles_text = "\n\n".join([
+            f"文章{j+1}:\n标题：{article.title}\n摘要：{article.summary}"
+            for j, article in enumerate(batch)
+        ])
         
-        # 将文章列表分批处理
-        for i in range(0, len(articles), batch_size):
-            batch = articles[i:i + batch_size]
-            
-            # 构建批量文章的文本
-            articles_text = "\n\n".join([
-                f"文章{j+1}:\n标题：{article.title}\n摘要：{article.summary}"
-                for j, article in enumerate(batch)
-            ])
-            
-            prompt = f"""
+        prompt = f"""
             # 角色
             你是一位专业且严谨的科研信息筛选专家，在各个科研领域都有深厚的知识储备，擅长精准地从大量文章中筛选出符合特定需求的内容。
 
             ## 任务说明
             1. 分析以下检索需求和多篇文章内容
             2. 判断每篇文章是否与检索需求相关，注意需要直接相关，即文章内容与每一个检索关键词都直接相关。
-            3. 将相关文章的标题以JSON数组格式返回
+            3. 对每篇相关文章给出0到1之间的置信度，表示其与检索需求直接相关的把握程度
+            4. 将相关文章的标题与置信度以JSON数组格式返回
             
             ## 输出要求
-            - 仅返回相关文章的标题列表
-            - 必须是JSON数组格式，如：["标题1", "标题2"]
+            - 仅返回相关文章的标题与置信度
+            - 必须是JSON数组格式，如：[{{"title": "标题1", "confidence": 0.9}}, {{"title": "标题2", "confidence": 0.6}}]
             - 如果没有相关文章，返回空数组 []
             - 不要包含任何其他解释或说明文字
             
@@ -583,42 +973,54 @@ class SearchProcessor:
             待分析文章：
             {articles_text}
 
-            请返回相关文章的标题列表（JSON数组格式）：
+            请返回相关文章的标题与置信度（JSON数组格式）：
             """
+        try:
+            print("LLM开始执行过滤任务")
+            response = llm.prompt(prompt, temperature=0.1)
+            # print("response: ", response)
+            # 解析返回的JSON数组
             try:
-                print("LLM开始执行过滤任务")
-                response = llm.prompt(prompt, temperature=0.1)
-                # print("response: ", response)
-                # 解析返回的JSON数组
-                try:
-                    result = response.strip()
-                    relevant_titles = json.loads(result)
-                    
-                    # 验证返回格式
-                    if not isinstance(relevant_titles, list):
-                        print(f"LLM返回格式错误，应为列表而不是 {type(relevant_titles)}")
-                        continue
-                    
-                    # 根据标题匹配找到相关文章
-                    for article in batch:
-                        if article.title in relevant_titles:
-                            filtered_articles.append(article)
-                            
-                except json.JSONDecodeError as e:
-                    print(f"JSON解析错误: {e}")
-                    print(f"原始返回内容: {result}")
-                    continue
-                    
-            except Exception as e:
-                print(f"LLM API调用错误: {e}")
-                continue
-            
-        return filtered_articles
+                result = response.strip()
+                relevant_titles = json.loads(result)
+                
+                # 验证返回格式
+                if not isinstance(relevant_titles, list):
+                    print(f"LLM返回格式错误，应为列表而不是 {type(relevant_titles)}")
+                    return None
+                
+                # 兼容只返回标题字符串的情况，此时置信度记为1
+                confidences = {}
+                for item in relevant_titles:
+                    if isinstance(item, dict) and 'title' in item:
+                        try:
+                            confidences[item['title']] = float(item.get('confidence', 1.0))
+                        except (TypeError, ValueError):
+                            confidences[item['title']] = 1.0
+                    elif isinstance(item, str):
+                        confidences[item] = 1.0
+                
+                # 根据标题匹配找到相关文章
+                return {
+                    article.entry_id: (True, confidences[article.title])
+                    for article in batch if article.title in confidences
+                }
+                        
+            except json.JSONDecodeError as e:
+                print(f"JSON解析错误: {e}")
+                print(f"原始返回内容: {result}")
+                return None
+                
+        except Exception as e:
+            print(f"LLM API调用错误: {e}")
+            return None
     
     def process_search(self, query, category, initial_articles):
         """
         处理搜索请求的主函数，按顺序执行三个过滤阶段
         
+        [retrieval] mode=hybrid时前两个阶段由并行的混合检索（RRF融合）取代
+        
         参数:
         - query: 用户查询字符串
         - category: 文章类别
@@ -627,6 +1029,7 @@ class SearchProcessor:
         返回:
         - final_articles: 最终筛选出的文章列表
         - stats: 各阶段的统计信息
+        - final_reports: 与final_articles对应的分析结果列表
         """
         stats = {
             "initial_count": len(initial_articles),
@@ -634,48 +1037,80 @@ class SearchProcessor:
             "embedding_filter_count": 0,
             "llm_filter_count": 0
         }
+        # 关键词只提取一次，各阶段共用
+        keywords = self.extract_keywords_qwen(query)
         
-        # 第一阶段：关键词过滤
-        keyword_filtered = self.keyword_filter(query, initial_articles)
-        stats["keyword_filter_count"] = len(keyword_filtered)
-        print(f"关键词过滤后剩余文章数: {len(keyword_filtered)}")
-        
-        if not keyword_filtered:
-            return [], stats
+        if self.config.retrieval_config()['mode'] == 'hybrid':
+            # 关键词与向量检索并行执行并融合，取代前两个串行的硬过滤阶段
+            embedding_filtered, _ = self.hybrid_filter(query, initial_articles, category, keywords=keywords)
+            stats["embedding_filter_count"] = len(embedding_filtered)
+            print(f"混合检索后剩余文章数: {len(embedding_filtered)}")
+        else:
+            # 第一阶段：关键词过滤
+            keyword_filtered = self.keyword_filter(query, initial_articles, category, keywords=keywords)
+            stats["keyword_filter_count"] = len(keyword_filtered)
+            print(f"关键词过滤后剩余文章数: {len(keyword_filtered)}")
             
-        # 第二阶段：embedding过滤
-        embedding_filtered = self.embedding_filter(query, keyword_filtered)
-        stats["embedding_filter_count"] = len(embedding_filtered)
-        print(f"Embedding过滤后剩余文章数: {len(embedding_filtered)}")
+            if not keyword_filtered:
+                return [], stats, []
+                
+            # 第二阶段：embedding过滤
+            embedding_filtered, _ = self.embedding_filter(query, keyword_filtered, category, keywords=keywords)
+            stats["embedding_filter_count"] = len(embedding_filtered)
+            print(f"Embedding过滤后剩余文章数: {len(embedding_filtered)}")
         
         if not embedding_filtered:
-            return [], stats
+            return [], stats, []
             
         # 第三阶段：LLM判断
-        final_articles = self.llm_filter(query, embedding_filtered)
+        final_articles = self.llm_filter(query, embedding_filtered, keywords)
         stats["llm_filter_count"] = len(final_articles)
         print(f"LLM判断后最终文章数: {len(final_articles)}")
         
-        # 添加后处理
-        post_processor = ArticlePostProcessor(self.client)
-        final_reports = post_processor.process_batch(final_articles, query)
+        # 添加后处理：生成分析结果（不单独导出报告文件）
+        from articles_processor import ArticlePostProcessor
+        post_processor = ArticlePostProcessor(self.llm)
+        final_reports = [
+            post_processor.process_article(article, query, report_type=None) for article in final_articles
+        ]
         
         return final_articles, stats, final_reports
 
-    def fetch_articles_from_db(self, category, limit=100):
+    def fetch_articles_from_db(self, category, limit=100, window=None, profile='report'):
         """从数据库获取文章数据
         
         Args:
             category (str, optional): 文章类别. 默认为None表示获取所有类别
             limit (int, optional): 最大获取数量. 默认100
+            window (tuple, optional): 发布时间窗口，默认按[window] days配置
+            profile (str, optional): 列投影，filter只取过滤所需的列，其余列在首次访问时加载；
+                启用文章快照时从快照读取，投影外的列一律按需加载
             
         Returns:
             list[Article]: 文章对象列表
         """
-        articles = self.db.fetch_articles_from_db(category, limit)
+        window = window or self.published_window()
+        if self.snapshot is not None:
+            # 从快照读取，投影外的列在首次访问时按需加载
+            return [
+                record.to_article(loader=self.db.load_columns, tz=BEIJING_TZ)
+                for record in self.snapshot.records(category, window, limit)
+            ]
+        articles = self.db.fetch_articles_from_db(category, limit, window=window, profile=profile)
         return articles
     
-    def fetch_articles_from_db_without_time(self, category, limit=1000):
+    def fetch_records_from_db(self, category, limit=100, window=None):
+        """获取过滤阶段使用的紧凑文章记录
+        
+        Returns:
+            list[ArticleRecord]: 只含过滤所需字段的文章记录，可通过to_article转换为Article
+        """
+        window = window or self.published_window()
+        if self.snapshot is not None:
+            return self.snapshot.records(category, window, limit)
+        return self.db.fetch_records_from_db(category, limit, window=window)
+
+    def fetch_articles_from_db_without_time(self, category, limit=1000, profile='report'):
         """从数据库获取文章数据
         
         Args:
@@ -686,7 +1121,7 @@ class SearchProcessor:
             list[Article]: 文章对象列表
         """
         
-        articles = self.db.fetch_articles_from_db_without_time(category, limit)
+        articles = self.db.fetch_articles_from_db_without_time(category, limit, profile=profile)
             
         return articles
 
@@ -700,10 +1135,6 @@ def create_search_processor(config):
     返回:
     - SearchProcessor实例
     """
-    api_client = OpenAI(
-        api_key=config.api_key(),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-    )
-    
-    return SearchProcessor(config.db_config(), api_client)
+    # LLMModel在首次调用时才创建OpenAI客户端
+    return SearchProcessor(config.db_config(), LLMModel())
 
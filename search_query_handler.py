@@ -1,8 +1,52 @@
-from datetime import datetime
+from array import array
+from datetime import datetime, timedelta
 from mysql.connector import Error
 import json
 from models import Database, Config
-from search_engine import create_search_processor
+from search_engine import create_search_processor, QUERY_FEATURES_VERSION
+
+
+def encode_embedding(vector):
+    """将embedding编码为float32字节串，存入BLOB列"""
+    return array('f', vector).tobytes() if vector is not None else None
+
+
+def decode_embedding(blob):
+    """从BLOB列还原embedding列表"""
+    if not blob:
+        return None
+    vector = array('f')
+    vector.frombytes(bytes(blob))
+    return vector.tolist()
+
+
+ACTIVE_REQUESTS_QUERY = """
+SELECT request_id, email, categories, query_content, push_time,
+       keywords, query_embedding, features_version, delivered_until
+FROM search_requests
+WHERE is_active = 1
+ORDER BY push_time, request_id
+"""
+
+
+def parse_request_row(row):
+    """将search_requests的一行转换为调度器使用的字典（同步与异步数据库层共用）"""
+    categories = json.loads(row['categories']) if row['categories'] else []
+    if isinstance(categories, str):
+        categories = [categories]
+    elif isinstance(categories, dict):
+        categories = list(categories.values())
+    # MySQL的TIME列返回timedelta，转换为time
+    push_time = row['push_time']
+    if isinstance(push_time, timedelta):
+        push_time = (datetime.min + push_time).time()
+    row.update(categories=categories, push_time=push_time)
+    if row.pop('features_version') == QUERY_FEATURES_VERSION and row['keywords']:
+        row.update(keywords=json.loads(row['keywords']), query_embedding=decode_embedding(row['query_embedding']))
+    else:
+        row.update(keywords=None, query_embedding=None)
+    return row
+
 
 class SearchRequest:
     """
@@ -13,6 +57,28 @@ class SearchRequest:
         print(self.config)
         self.db = Database(self.config.db_config())
         # print(self.db)
+        self._search_processor = None
+
+    @property
+    def search_processor(self):
+        """延迟创建SearchProcessor，只在需要计算关键词与向量时初始化"""
+        if self._search_processor is None:
+            self._search_processor = create_search_processor(self.config)
+        return self._search_processor
+
+    def compute_query_features(self, query_content):
+        """
+        计算订阅的关键词与关键词embedding
+        
+        返回:
+        - (keywords, query_vector)，计算失败（含LLM提取失败）时返回 (None, None)，
+          此时不写入features_version，由调度器在下次运行时重新计算
+        """
+        try:
+            return self.search_processor.compute_query_features(query_content)
+        except Exception as e:
+            print(f"计算查询关键词与向量时出错: {e}")
+            return None, None
     def store_search_request(self, email, categories, query_content, push_time):
         """
         将用户的检索请求存储到数据库中
@@ -28,44 +94,91 @@ class SearchRequest:
         """
         insert_query = """
         INSERT INTO search_requests 
-        (email, categories, query_content, push_time)
-        VALUES (%s, %s, %s, %s)
+        (email, categories, query_content, push_time, keywords, query_embedding, features_version)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
+        # 订阅内容在存储时提取关键词并计算向量，每日运行时直接读取
+        keywords, query_vector = self.compute_query_features(query_content)
+        
+        # 确保categories是JSON字符串
+        if isinstance(categories, (dict, list)):
+            categories = json.dumps(categories)
+        
+        # 确保push_time是time类型
+        if isinstance(push_time, str):
+            push_time = datetime.strptime(push_time, '%H:%M').time()
         
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            # 确保categories是JSON字符串
-            if isinstance(categories, (dict, list)):
-                categories = json.dumps(categories)
-            
-            # 确保push_time是time类型
-            if isinstance(push_time, str):
-                push_time = datetime.strptime(push_time, '%H:%M').time()
-            
-            cursor.execute(insert_query, (
-                email,
-                categories,
-                query_content,
-                push_time
-            ))
-            
-            request_id = cursor.lastrowid
-            conn.commit()
-            return request_id
+            with self.db.cursor(commit=True) as cursor:
+                cursor.execute(insert_query, (
+                    email,
+                    categories,
+                    query_content,
+                    push_time,
+                    json.dumps(keywords, ensure_ascii=False) if keywords is not None else None,
+                    encode_embedding(query_vector),
+                    QUERY_FEATURES_VERSION if keywords is not None else None
+                ))
+                return cursor.lastrowid
             
         except Error as e:
             print(f"存储检索请求时出错: {e}")
-            if 'conn' in locals() and conn:
-                conn.rollback()
             return None
-        finally:
-            if 'cursor' in locals() and cursor:
-                cursor.close()
-            if 'conn' in locals() and conn:
-                conn.close()
     
+    def update_search_request(self, request_id, categories=None, query_content=None, push_time=None, is_active=None):
+        """
+        修改检索请求，只更新传入的字段；修改query_content时重新计算关键词与向量
+        
+        返回:
+        - bool: 是否更新成功
+        """
+        fields = {}
+        if categories is not None:
+            fields['categories'] = json.dumps(categories) if isinstance(categories, (dict, list)) else categories
+        if push_time is not None:
+            fields['push_time'] = datetime.strptime(push_time, '%H:%M').time() if isinstance(push_time, str) else push_time
+        if is_active is not None:
+            fields['is_active'] = int(bool(is_active))
+        if query_content is not None:
+            keywords, query_vector = self.compute_query_features(query_content)
+            fields.update(
+                query_content=query_content,
+                keywords=json.dumps(keywords, ensure_ascii=False) if keywords is not None else None,
+                query_embedding=encode_embedding(query_vector),
+                features_version=QUERY_FEATURES_VERSION if keywords is not None else None
+            )
+        if not fields:
+            return True
+        return self._update_request_fields(request_id, fields)
+
+    def refresh_query_features(self, request_id, query_content):
+        """
+        为缺少或版本过期的订阅重新计算关键词与向量并写回
+        
+        返回:
+        - (keywords, query_vector)，计算失败时返回 (None, None)
+        """
+        keywords, query_vector = self.compute_query_features(query_content)
+        if keywords is not None:
+            self._update_request_fields(request_id, {
+                'keywords': json.dumps(keywords, ensure_ascii=False),
+                'query_embedding': encode_embedding(query_vector),
+                'features_version': QUERY_FEATURES_VERSION,
+            })
+        return keywords, query_vector
+
+    def _update_request_fields(self, request_id, fields):
+        # 列名来自固定的字段集合，值通过参数传递
+        assignments = ", ".join(f"{column} = %s" for column in fields)
+        update_query = f"UPDATE search_requests SET {assignments} WHERE request_id = %s"
+        try:
+            with self.db.cursor(commit=True) as cursor:
+                cursor.execute(update_query, (*fields.values(), request_id))
+            return True
+        except Error as e:
+            print(f"更新检索请求时出错: {e}")
+            return False
+
     def store_search_results(self, request_id, results):
         """
         存储检索结果
@@ -80,31 +193,98 @@ class SearchRequest:
         VALUES (%s, %s, %s, %s)
         """
         
+        # 更新search_requests表中的result_count
+        update_query = """
+        UPDATE search_requests 
+        SET result_count = %s 
+        WHERE request_id = %s
+        """
+        
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.executemany(insert_query, [
-                (request_id, result[0], result[1], result[2])
-                for result in results
-            ])
-            
-            # 更新search_requests表中的result_count
-            update_query = """
-            UPDATE search_requests 
-            SET result_count = %s 
-            WHERE request_id = %s
-            """
-            cursor.execute(update_query, (len(results), request_id))
-            
-            conn.commit()
+            with self.db.cursor(commit=True) as cursor:
+                cursor.executemany(insert_query, [
+                    (request_id, result[0], result[1], result[2])
+                    for result in results
+                ])
+                cursor.execute(update_query, (len(results), request_id))
             
         except Error as e:
             print(f"存储检索结果时出错: {e}")
-            if conn:
-                conn.rollback()
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+
+    def fetch_active_requests(self):
+        """
+        获取所有有效的检索请求
+        
+        返回:
+        - requests: 列表，每项为包含request_id、email、categories(list)、query_content、push_time(datetime.time)、
+          keywords(list)、query_embedding(list)、delivered_until(datetime)的字典；关键词与向量缺失或版本过期时为None
+        """
+        try:
+            with self.db.cursor(dictionary=True) as cursor:
+                cursor.execute(ACTIVE_REQUESTS_QUERY)
+                rows = cursor.fetchall()
+        except Error as e:
+            print(f"获取检索请求时出错: {e}")
+            return []
+        return [parse_request_row(row) for row in rows]
+
+    def fetch_delivered_ids(self, request_id, since):
+        """
+        获取订阅自since以来已投递过的文章ID
+        
+        返回:
+        - set[str]: entry_id集合
+        """
+        query = """
+        SELECT entry_id FROM delivered_articles
+        WHERE request_id = %s AND delivered_at >= %s
+        """
+        try:
+            with self.db.cursor() as cursor:
+                cursor.execute(query, (request_id, since))
+                return {row[0] for row in cursor.fetchall()}
+        except Error as e:
+            print(f"获取已投递文章时出错: {e}")
+            return set()
+
+    def mark_delivered(self, request_id, entry_ids, delivered_until):
+        """
+        记录本次投递的文章并推进订阅的投递水位
+        
+        参数:
+        - request_id: 检索请求ID
+        - entry_ids: 本次投递的文章ID列表
+        - delivered_until: 本次评估窗口的终点，下次运行从这里开始
+        """
+        insert_query = """
+        INSERT IGNORE INTO delivered_articles (request_id, entry_id)
+        VALUES (%s, %s)
+        """
+        update_query = """
+        UPDATE search_requests SET delivered_until = %s
+        WHERE request_id = %s
+        """
+        try:
+            with self.db.cursor(commit=True) as cursor:
+                if entry_ids:
+                    cursor.executemany(insert_query, [(request_id, entry_id) for entry_id in entry_ids])
+                cursor.execute(update_query, (delivered_until, request_id))
+            return True
+        except Error as e:
+            print(f"记录投递水位时出错: {e}")
+            return False
+
+
+async def fetch_active_requests_async(async_db):
+    """
+    SearchRequest.fetch_active_requests的异步版本
+    
+    参数:
+    - async_db: AsyncDatabase实例
+    """
+    try:
+        rows = await async_db.fetch_all(ACTIVE_REQUESTS_QUERY)
+    except Exception as e:
+        print(f"获取检索请求时出错: {e}")
+        return []
+    return [parse_request_row(row) for row in rows]
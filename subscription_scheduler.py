@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from models import Config, BEIJING_TZ, published_window
+from query_clustering import VerdictCache, cluster_queries
+from search_query_handler import SearchRequest
+from utils.logger import Logger
+
+logger = Logger.get_logger('subscription_scheduler')
+
+
+class SubscriptionScheduler:
+    """多用户订阅调度器，基于search_requests表驱动
+
+    每个推送窗口内的有效订阅按类别分组：同一类别的当日文章只从数据库获取一次，
+    组内所有订阅共享这份快照；每个订阅的检索过滤与深度分析提交到共享的线程池，
+    结果通过store_search_results写回。
+    语义相近的查询聚为一簇，簇内订阅共享LLM相关性判断（按天失效）。
+    每个订阅只评估其投递水位之后发布、且尚未投递过的文章，补跑不会重复推送。
+    """
+    def __init__(self, analyzer, window_minutes=60, max_workers=4, cluster_threshold=0.9):
+        self.analyzer = analyzer
+        self.window_minutes = window_minutes
+        self.search_request = SearchRequest()
+        self.config = Config()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='subscription')
+        self._last_window = None  # 最近一次处理的推送窗口起点(datetime)
+        self._lock = threading.Lock()
+        self.cluster_threshold = cluster_threshold
+        self.verdict_cache = VerdictCache()
+        self._verdict_date = None
+
+    def window_of(self, push_time):
+        """推送时间所在窗口的起点（距零点的分钟数）"""
+        minutes = push_time.hour * 60 + push_time.minute
+        return minutes - minutes % self.window_minutes
+
+    def _next_window(self, window_start):
+        """下一个推送窗口的起点，窗口不跨越零点"""
+        following = window_start + timedelta(minutes=self.window_minutes)
+        if following.date() != window_start.date():
+            following = following.replace(hour=0, minute=0)
+        return following
+
+    def group_requests(self, requests):
+        """按 (推送窗口, 类别) 对订阅分组
+
+        Returns:
+            dict: {window: {category: [request, ...]}}，多类别订阅出现在其每个类别下
+        """
+        groups = defaultdict(lambda: defaultdict(list))
+        for request in requests:
+            window = self.window_of(request['push_time'])
+            for category in request['categories'] or [None]:
+                groups[window][category].append(request)
+        return groups
+
+    def article_window(self, request):
+        """订阅的文章发布时间窗口：从投递水位开始（最多追溯max_catchup_days天），无水位时按[window] days"""
+        start, end = self.analyzer.search_processor.published_window()
+        delivered_until = request.get('delivered_until')
+        if delivered_until is not None:
+            start, _ = published_window(start=delivered_until)
+            start = max(start, end - timedelta(days=self.config.max_catchup_days()))
+        return start, end
+
+    def _fetch_snapshots(self, grouped):
+        """每个类别只取一次文章记录，窗口覆盖组内所有订阅的窗口
+
+        启用[snapshot]时各类别都从SearchProcessor的共享文章快照中读取，数据库只按发布时间查询一次
+        """
+        snapshots = {}
+        for category, requests in grouped.items():
+            windows = [request['article_window'] for request in requests]
+            window = (min(start for start, _ in windows), max(end for _, end in windows))
+            # 快照以紧凑的ArticleRecord保存过滤所需的列；全文、中文翻译、作者机构等在文章入选后才按需加载。
+            # 不限制数量：补跑窗口可能跨越多天，按发布时间倒序截断会丢掉较早的文章，
+            # 而投递水位仍会推进到窗口终点，这些文章将永远不会被评估
+            snapshots[category] = self.analyzer.search_processor.fetch_records_from_db(
+                category, limit=None, window=window
+            )
+            logger.info(f"类别 {category or '所有类别'} 获取到 {len(snapshots[category])} 篇文章")
+        return snapshots
+
+    def _ensure_query_features(self, requests):
+        """为关键词与向量缺失或版本过期的订阅补算并写回，之后的运行直接读取"""
+        for request in requests.values():
+            if request.get('keywords') is None:
+                keywords, query_vector = self.search_request.refresh_query_features(
+                    request['request_id'], request['query_content']
+                )
+                request.update(keywords=keywords, query_embedding=query_vector)
+
+    def _cluster_requests(self, requests):
+        """按查询embedding聚类，返回 {请求ID: QueryCluster}"""
+        # 判断结果只对当日文章有效，跨天清空
+        today = datetime.now().date()
+        with self._lock:
+            if self._verdict_date != today:
+                self.verdict_cache.clear()
+                self._verdict_date = today
+
+        queries = {request_id: request['query_content'] for request_id, request in requests.items()}
+        vectors = {
+            request_id: request['query_embedding']
+            for request_id, request in requests.items() if request.get('query_embedding')
+        }
+        try:
+            clusters = cluster_queries(
+                queries, self.analyzer.search_processor.vector_db.get_embedding, self.cluster_threshold,
+                vectors=vectors
+            )
+        except Exception as e:
+            logger.error(f"查询聚类失败，各订阅独立过滤: {e}")
+            return {}
+        # 簇代表的关键词直接取自其持久化的特征
+        for cluster in set(clusters.values()):
+            if cluster.keywords is None:
+                cluster.keywords = requests[cluster.members[0]].get('keywords')
+        return clusters
+
+    def _process_request(self, request, snapshots, output_root, cluster=None, outbox=None):
+        """处理单个订阅：合并其各类别的文章快照后执行检索、分析与推送"""
+        categories = request['categories'] or [None]
+        window_start, window_end = request['article_window']
+        if window_start >= window_end:
+            logger.info(f"订阅 {request['request_id']} 今日已投递，跳过")
+            if outbox is not None:
+                outbox.store(request, None, [], request['delivered_until'], 0)
+            return None
+        # 已投递过的文章不再参与评估
+        seen = self.search_request.fetch_delivered_ids(request['request_id'], window_start.replace(tzinfo=None))
+        loader = self.analyzer.search_processor.db.load_columns
+        articles = []
+        for category in categories:
+            for record in snapshots.get(category, []):
+                published = record.published
+                if published is not None and not (window_start <= published < window_end):
+                    continue
+                if record.entry_id not in seen:
+                    seen.add(record.entry_id)
+                    # 每个订阅得到独立的Article：各订阅写入的向量分、置信度等排序字段互不干扰
+                    articles.append(record.to_article(loader=loader, tz=BEIJING_TZ))
+
+        # 多类别订阅在向量检索阶段不限制类别，候选集已由快照限定
+        category = categories[0] if len(categories) == 1 else None
+        started = time.monotonic()
+        result = self.analyzer.process_query(
+            request['query_content'],
+            category,
+            send_to_email=outbox is None,
+            articles=articles,
+            output_dir=os.path.join(output_root, str(request['request_id'])),
+            recipient_email=request['email'],
+            cluster=cluster,
+            verdict_cache=self.verdict_cache if cluster is not None else None,
+            keywords=request.get('keywords'),
+            query_vector=request.get('query_embedding'),
+            window=request['article_window']
+        )
+        ranked = [
+            (article.entry_id, ranking, score)
+            for ranking, (article, score) in enumerate(result["ranked"], 1)
+        ]
+        if ranked:
+            self.search_request.store_search_results(request['request_id'], ranked)
+        watermark = window_end.astimezone(BEIJING_TZ).replace(tzinfo=None)
+        if outbox is not None:
+            # 提前准备模式：报告存入发件箱，由投递任务在推送时间发送并推进水位
+            outbox.store(request, result["merged_report"], [entry_id for entry_id, _, _ in ranked],
+                         watermark, time.monotonic() - started)
+        # 报告发送成功（或没有相关文章）才推进水位，失败的订阅下次从原水位重试
+        elif result["delivered"] or not ranked:
+            self.search_request.mark_delivered(
+                request['request_id'],
+                [entry_id for entry_id, _, _ in ranked] if result["delivered"] else [],
+                watermark
+            )
+        logger.info(f"订阅 {request['request_id']} 处理完成，推荐 {len(ranked)} 篇文章")
+        return result
+
+    @staticmethod
+    def group_by_category(requests):
+        """按类别对订阅分组：{category: [request, ...]}，多类别订阅出现在其每个类别下"""
+        grouped = defaultdict(list)
+        for request in requests:
+            for category in request['categories'] or [None]:
+                grouped[category].append(request)
+        return grouped
+
+    def run_window(self, window, grouped, outbox=None):
+        """处理一个推送窗口内的所有订阅"""
+        logger.info(f"推送窗口 {window // 60:02d}:{window % 60:02d}")
+        self.run_batch(grouped, outbox=outbox)
+
+    def run_batch(self, grouped, outbox=None):
+        """处理一批按类别分组的订阅
+
+        Args:
+            grouped: {category: [request, ...]}
+            outbox: 提供时只生成报告并存入发件箱，不直接发送
+        """
+        requests = {request['request_id']: request for group in grouped.values() for request in group}
+        for request in requests.values():
+            request['article_window'] = self.article_window(request)
+        snapshots = self._fetch_snapshots(grouped)
+        output_root = os.path.join(
+            os.getcwd(), "analysis_report", datetime.now().strftime('%Y%m%d_%H%M')
+        )
+        logger.info(f"本批共 {len(requests)} 个订阅")
+        self._ensure_query_features(requests)
+        clusters = self._cluster_requests(requests)
+
+        futures = {
+            request_id: self._executor.submit(
+                self._process_request, request, snapshots, output_root, clusters.get(request_id), outbox
+            )
+            for request_id, request in requests.items()
+        }
+        for request_id, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"处理订阅 {request_id} 时出错: {e}")
+        logger.info(
+            f"LLM判断缓存命中 {self.verdict_cache.hits} 次，未命中 {self.verdict_cache.misses} 次"
+        )
+
+    def run_pending(self, now=None):
+        """处理上次处理的窗口之后、直到当前时间所在窗口的所有推送窗口，供主循环每分钟调用
+
+        窗口在主循环中同步处理，一次运行超过window_minutes时下一次调用会依次补上期间错过的窗口，
+        不会因为运行时间过长而跳过其中订阅当天的推送。首次调用只处理当前窗口。
+        """
+        now = now or datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        current = midnight + timedelta(minutes=self.window_of(now.time()))
+        with self._lock:
+            if self._last_window is not None and self._last_window >= current:
+                return
+            if self._last_window is None:
+                pending = [current]
+            else:
+                # 最多补一天内的窗口
+                start = self._next_window(max(self._last_window, current - timedelta(days=1)))
+                pending = []
+                while start <= current:
+                    pending.append(start)
+                    start = self._next_window(start)
+            self._last_window = current
+
+        groups = self.group_requests(self.search_request.fetch_active_requests())
+        for window_start in pending:
+            window = self.window_of(window_start.time())
+            if window in groups:
+                self.run_window(window, groups[window])
+
+    def run_all(self):
+        """立即处理所有有效订阅（忽略推送时间），用于手动补跑"""
+        groups = self.group_requests(self.search_request.fetch_active_requests())
+        for window in sorted(groups):
+            self.run_window(window, groups[window])
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    from models import Config
+except ImportError:  # models依赖mysql-connector与pytz
+    Config = None
+
+
+@unittest.skipIf(Config is None, "models无法导入：缺少依赖")
+class ConfigExampleTest(unittest.TestCase):
+    """config.ini.example必须能被Config完整解析，示例中的取值要落在对应的节里"""
+    def setUp(self):
+        self.config = Config(os.path.join(ROOT, 'config.ini.example'))
+
+    def test_config_accessors(self):
+        for name in dir(self.config):
+            if name.endswith('_config'):
+                with self.subTest(accessor=name):
+                    self.assertTrue(getattr(self.config, name)())
+
+    def test_keyword_and_snapshot(self):
+        self.assertEqual(self.config.keyword_backend(), 'fulltext')
+        self.assertEqual(self.config.keyword_title_weight(), 2.0)
+        self.assertFalse(self.config.bm25_include_cn())
+        self.assertTrue(self.config.snapshot_enabled())
+        self.assertEqual(self.config.snapshot_refresh_seconds(), 300)
+
+    def test_retrieval_keys_read_from_retrieval_section(self):
+        section = self.config.config['retrieval']
+        self.assertEqual(set(section), set(self.config.retrieval_config()))
+        self.assertEqual(self.config.retrieval_config()['vector_scoring'], 'search')
+        self.assertNotIn('mode', self.config.config['keyword'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mail_queue import MailQueue, SMTPPool
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """最小的SMTP服务端实现，只支持SMTPPool用到的命令"""
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        self.reply("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stub")
+            elif command.startswith("DATA"):
+                self.reply("354 end with <CRLF>.<CRLF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    lines.append(data)
+                with server.lock:
+                    reject = server.reject_remaining > 0
+                    if reject:
+                        server.reject_remaining -= 1
+                    else:
+                        server.messages.append(b"".join(lines))
+                self.reply("451 try again later" if reject else "250 queued")
+            elif command.startswith("QUIT"):
+                self.reply("221 bye")
+                return
+            else:
+                # MAIL / RCPT / RSET / NOOP
+                self.reply("250 ok")
+
+
+class _SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, reject=0):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.reject_remaining = reject
+
+
+def _message(subject):
+    msg = EmailMessage()
+    msg['From'] = 'digest@example.com'
+    msg['To'] = 'reader@example.com'
+    msg['Subject'] = subject
+    msg.set_content('body')
+    return msg
+
+
+class MailQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.close(wait=False)
+        for server in getattr(self, 'servers', []):
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def start(self, reject=0, max_retries=3):
+        server = _SMTPStub(reject)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers = getattr(self, 'servers', []) + [server]
+        pool = SMTPPool('127.0.0.1', server.server_address[1], starttls=False, size=1, timeout=5)
+        queue = MailQueue(pool, self.spool_dir, workers=1, max_retries=max_retries, retry_backoff=0.05)
+        self.queues.append(queue)
+        return server, queue
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def spooled(self):
+        return [name for name in os.listdir(self.spool_dir) if name.endswith('.eml')]
+
+    def test_sends_and_removes_spool_file(self):
+        server, queue = self.start()
+        queue.enqueue(_message('first'))
+        queue.enqueue(_message('second'))
+        self.assertTrue(self.wait_for(lambda: queue.sent == 2))
+        self.assertEqual(len(server.messages), 2)
+        self.assertEqual(self.spooled(), [])
+
+    def test_recovers_spooled_messages_on_start(self):
+        with open(os.path.join(self.spool_dir, '1-pending.eml'), 'wb') as f:
+            f.write(_message('left over').as_bytes())
+        server, queue = self.start()
+        self.assertTrue(self.wait_for(lambda: queue.sent == 1))
+        self.assertIn(b'left over', server.messages[0])
+
+    def test_retries_after_temporary_failure(self):
+        server, queue = self.start(reject=2)
+        queue.enqueue(_message('retry'))
+        self.assertTrue(self.wait_for(lambda: queue.sent == 1))
+        self.assertEqual(len(server.messages), 1)
+        self.assertEqual(queue.failed, 0)
+
+    def test_moves_to_failed_after_max_retries(self):
+        server, queue = self.start(reject=100, max_retries=1)
+        path = queue.enqueue(_message('doomed'))
+        self.assertTrue(self.wait_for(lambda: queue.failed == 1))
+        self.assertTrue(os.path.exists(os.path.join(queue.failed_dir, os.path.basename(path))))
+        self.assertEqual(self.spooled(), [])
+
+    def test_worker_survives_failed_move(self):
+        server, queue = self.start(reject=1, max_retries=0)
+        # failed目录被同名文件占用，移入failed会出错，但不能结束工作线程
+        shutil.rmtree(queue.failed_dir)
+        open(queue.failed_dir, 'w').close()
+        path = queue.enqueue(_message('unmovable'))
+        self.assertTrue(self.wait_for(lambda: queue.failed == 1))
+        os.remove(path)
+        queue.enqueue(_message('after failure'))
+        self.assertTrue(self.wait_for(lambda: queue.sent == 1))
+        self.assertIn(b'after failure', server.messages[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
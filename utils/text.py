@@ -0,0 +1,51 @@
+import re
+
+# 英文单词（含数字、连字符）与中日韩统一表意文字
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_CJK_PATTERN = re.compile(r"[一-鿿]+")
+
+ENGLISH_STOPWORDS = frozenset("""
+a an and are as at be been but by can for from has have in into is it its of on or our
+that the their them then there these they this to was we were which while with within
+""".split())
+
+
+def tokenize(text, drop_stopwords=True):
+    """将中英文混合文本切分为检索用的词项
+
+    英文按单词切分并转小写；中文没有空格分词，使用字符二元组(bigram)，
+    与MySQL ngram全文索引的默认切分方式保持一致。
+
+    Args:
+        text (str): 输入文本
+        drop_stopwords (bool): 是否去掉英文停用词
+
+    Returns:
+        list[str]: 词项列表（保留重复，用于统计词频）
+    """
+    if not text:
+        return []
+    lowered = text.lower()
+    tokens = [
+        token for token in _WORD_PATTERN.findall(lowered)
+        if not (drop_stopwords and token in ENGLISH_STOPWORDS)
+    ]
+    for run in _CJK_PATTERN.findall(lowered):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def estimate_tokens(text):
+    """粗略估算文本占用的LLM token数
+
+    不依赖具体模型的tokenizer：英文按约1.3 token/词，中文按1 token/字估算，
+    只用于预算控制，不追求精确。
+    """
+    if not text:
+        return 0
+    n_cjk = sum(len(run) for run in _CJK_PATTERN.findall(text))
+    n_words = len(_WORD_PATTERN.findall(text.lower()))
+    return int(n_words * 1.3) + n_cjk